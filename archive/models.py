@@ -13,8 +13,12 @@ from wagtail.core.models import Page
 from wagtail.images.blocks import ImageChooserBlock
 from wagtail.snippets.edit_handlers import SnippetChooserPanel
 
+from migcontrol.conditional import ConditionalServeMixin
+from migcontrol.conditional import ListingConditionalServeMixin
+from migcontrol.richtext import richtext
 
-class ArchiveIndexPage(Page):
+
+class ArchiveIndexPage(ListingConditionalServeMixin, Page):
     template = "archive/index.html"
 
     body = StreamField(
@@ -73,7 +77,7 @@ class ArchivePageLocation(models.Model):
         unique_together = ("page", "location")
 
 
-class ArchivePage(Page):
+class ArchivePage(ConditionalServeMixin, Page):
 
     wordpress_post_id = models.PositiveSmallIntegerField(
         blank=True, null=True, editable=False
@@ -111,6 +115,9 @@ class ArchivePage(Page):
     def get_display_locations(self):
         return ", ".join(str(ll.location) for ll in self.locations.all())
 
+    def get_description(self):
+        return richtext(self.description)
+
     content_panels = Page.content_panels + [
         FieldPanel("organization_type"),
         FieldPanel("country"),
@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+
+def backfill(queryset, process, batch_size):
+    """
+    Calls process(obj) for every object of the queryset, in batches ordered
+    by pk with one transaction per batch. Each batch continues after the last
+    pk of the one before, so objects that process() takes out of the
+    queryset are neither skipped nor visited twice, and an interrupted run
+    can simply be started again. Yields the number of objects processed
+    after every batch.
+    """
+    queryset = queryset.order_by("pk")
+    processed = 0
+    last_pk = 0
+    while True:
+        batch = list(queryset.filter(pk__gt=last_pk)[:batch_size])
+        if not batch:
+            return
+        with transaction.atomic():
+            for obj in batch:
+                process(obj)
+        processed += len(batch)
+        last_pk = batch[-1].pk
+        yield processed
+
+
+class BackfillCommand(BaseCommand):
+    """
+    Base for the commands that store something for existing pages, which is
+    otherwise stored when a page is saved or published. Adds --batch-size,
+    and --all with all_help as its help unless that's None.
+    """
+
+    all_help = None
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=100,
+            help="Number of pages processed per transaction",
+        )
+        if self.all_help is not None:
+            parser.add_argument("--all", action="store_true", help=self.all_help)
+
+    def backfill(self, queryset, process, label, batch_size):
+        """
+        Runs backfill() with progress output. Returns the number of objects
+        processed.
+        """
+        processed = 0
+        for processed in backfill(queryset, process, batch_size):
+            self.stdout.write("{}: {} processed".format(label, processed))
+        self.stdout.write("{}: done, {} processed".format(label, processed))
+        return processed
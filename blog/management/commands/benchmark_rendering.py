@@ -0,0 +1,141 @@
+import time
+
+from bs4 import BeautifulSoup
+from django.core.management.base import BaseCommand
+from django.db.models.functions import Length
+
+from blog.models import BlogPage
+from migcontrol.headings import anchor_headings
+from migcontrol.rendering import RenderedBody
+from migcontrol.utils import get_toc
+from wiki.models import WikiPage
+
+
+class ParseCounter:
+    """
+    Counts how many times BeautifulSoup parses a document while active.
+    """
+
+    def __init__(self):
+        self.count = 0
+
+    def __enter__(self):
+        self.original_init = BeautifulSoup.__init__
+
+        def counting_init(soup, *args, **kwargs):
+            self.count += 1
+            return self.original_init(soup, *args, **kwargs)
+
+        BeautifulSoup.__init__ = counting_init
+        return self
+
+    def __exit__(self, *exc_info):
+        BeautifulSoup.__init__ = self.original_init
+
+
+def legacy_render(page):
+    """
+    What a render of blog_page.html used to cost: get_toc() called get_body()
+    and parsed its output again, then the content called get_body() again.
+    """
+    body = page.render_body().html
+    get_toc(body)
+    page.render_body().html
+
+
+def rendered_body_render(page):
+    rendered = page.render_body()
+    rendered.toc
+    rendered.html
+
+
+def engine_render(engine):
+    def render(page):
+        RenderedBody.from_html(page.expand_body(), engine=engine).toc
+
+    return render
+
+
+def engines_agree(body):
+    """
+    Whether the tokenizer gives the same headings and the same document as
+    html5lib, once both outputs are normalized by html5lib.
+    """
+    html5lib_html, html5lib_headings = anchor_headings(body, engine="html5lib")
+    tokenizer_html, tokenizer_headings = anchor_headings(body, engine="tokenizer")
+    return html5lib_headings == tokenizer_headings and (
+        anchor_headings(html5lib_html, engine="html5lib")[0]
+        == anchor_headings(tokenizer_html, engine="html5lib")[0]
+    )
+
+
+class Command(BaseCommand):
+    """
+    Benchmarks rendering the body and TOC of the largest blog and wiki pages.
+    The render cache is not used, so every run measures a cold render.
+    """
+
+    help = "Benchmark body and TOC rendering of the largest blog and wiki pages"
+
+    renderers = [
+        ("legacy", legacy_render),
+        ("rendered body", rendered_body_render),
+        ("html5lib", engine_render("html5lib")),
+        ("tokenizer", engine_render("tokenizer")),
+    ]
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--pages",
+            type=int,
+            default=10,
+            help="Number of the largest blog and wiki pages to render",
+        )
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=5,
+            help="Number of times each page is rendered",
+        )
+
+    def get_pages(self, limit):
+        pages = []
+        for model, body_field in [
+            (BlogPage, "body_richtext"),
+            (WikiPage, "description"),
+        ]:
+            pages += list(
+                model.objects.live()
+                .annotate(body_length=Length(body_field))
+                .order_by("-body_length")[:limit]
+            )
+        return pages
+
+    def handle(self, *args, **options):
+        pages = self.get_pages(options["pages"])
+        repeat = options["repeat"]
+        if not pages:
+            self.stdout.write("No live blog or wiki pages to render")
+            return
+
+        renders = len(pages) * repeat
+        self.stdout.write("Rendering {} pages {} times each".format(len(pages), repeat))
+        for name, render in self.renderers:
+            with ParseCounter() as counter:
+                start = time.perf_counter()
+                for __ in range(repeat):
+                    for page in pages:
+                        render(page)
+                elapsed = time.perf_counter() - start
+            self.stdout.write(
+                "{:<16} {:>5.1f} parses/page {:>10.2f} ms/page".format(
+                    name, counter.count / renders, elapsed * 1000 / renders
+                )
+            )
+
+        differing = [page for page in pages if not engines_agree(page.expand_body())]
+        self.stdout.write(
+            "Pages where the engines disagree: {}".format(
+                ", ".join(str(page.pk) for page in differing) or "none"
+            )
+        )
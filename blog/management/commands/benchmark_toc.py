@@ -0,0 +1,102 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from migcontrol.utils import toc
+
+
+def recursive_toc(lst):
+    """
+    The recursive TOC builder that toc() replaced, kept for comparison. It
+    slices the list and rescans it for every sibling.
+    """
+
+    def until_next_outer(lst, level):
+        for element in lst:
+            if element[0] > level:
+                yield element
+            else:
+                return
+
+    if not lst:
+        return []
+
+    item0 = lst[0]
+
+    if len(lst) == 1:
+        return [(item0[1], [])]
+
+    children = recursive_toc(list(until_next_outer(lst[1:], item0[0])))
+    siblings = [(item0[1], children)]
+    start_offset = 1 + len(children)
+    for cnt, item in enumerate(lst[start_offset:]):
+
+        if item[0] == item0[0]:
+            children_detect_offset = start_offset + cnt + 1
+            children_list = list(
+                until_next_outer(lst[children_detect_offset:], item[0])
+            )
+            siblings.append((item[1], recursive_toc(children_list)))
+
+    return siblings
+
+
+def generate_headings(count, seed=0):
+    """
+    A document outline starting with an h2, where each following heading goes
+    at most one level deeper, like in the imported wiki pages.
+    """
+    rng = random.Random(seed)
+    headings = []
+    level = 2
+    for i in range(count):
+        headings.append((level, "Heading {}".format(i), "header-heading-{}".format(i)))
+        level = rng.randint(2, min(level + 1, 5))
+    return headings
+
+
+class Command(BaseCommand):
+    """
+    Microbenchmark of building a TOC from generated documents with 10 to 5000
+    headings.
+    """
+
+    help = "Benchmark TOC building on generated documents"
+
+    sizes = [10, 100, 500, 1000, 5000]
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=5,
+            help="Number of times each document is built",
+        )
+        parser.add_argument(
+            "--skip-recursive",
+            action="store_true",
+            help="Only time toc(), the recursive builder is slow on large sizes",
+        )
+
+    def time_builder(self, builder, headings, repeat):
+        start = time.perf_counter()
+        for __ in range(repeat):
+            builder(headings)
+        return (time.perf_counter() - start) * 1000 / repeat
+
+    def handle(self, *args, **options):
+        repeat = options["repeat"]
+        self.stdout.write("{:>9} {:>12} {:>14}".format("headings", "toc", "recursive"))
+        for size in self.sizes:
+            headings = generate_headings(size)
+            linear = self.time_builder(toc, headings, repeat)
+            if options["skip_recursive"]:
+                recursive = "-"
+            else:
+                recursive = "{:.2f} ms".format(
+                    self.time_builder(recursive_toc, headings, repeat)
+                )
+            self.stdout.write(
+                "{:>9} {:>9.2f} ms {:>14}".format(size, linear, recursive)
+            )
@@ -0,0 +1,32 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from migcontrol.staticfiles import brotli
+from migcontrol.staticfiles import compress_static_files
+
+
+class Command(BaseCommand):
+    """
+    Writes .gz and .br variants of the hashed files in STATIC_ROOT, which
+    migcontrol.staticfiles.StaticFilesApplication serves to clients that
+    accept them. Run it last, after collectstatic, compress and
+    generate_static_thumbnails.
+    """
+
+    help = "Write compressed variants of the hashed static files"
+
+    def handle(self, *args, **options):
+        if brotli is None:
+            self.stderr.write("brotli isn't installed, only writing .gz files")
+        count = 0
+        for path, suffixes in compress_static_files(settings.STATIC_ROOT):
+            count += 1
+            if options["verbosity"] > 1:
+                self.stdout.write(
+                    "{} {}".format(
+                        os.path.relpath(path, settings.STATIC_ROOT), " ".join(suffixes)
+                    )
+                )
+        self.stdout.write("Compressed {} static files".format(count))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+
+from migcontrol.thumbnails import generate_static_thumbnails
+from migcontrol.thumbnails import MANIFEST_NAME
+
+
+class Command(BaseCommand):
+    """
+    Generates the thumbnails of static files listed in
+    MIGCONTROL_STATIC_THUMBNAILS into STATIC_ROOT, and writes the manifest
+    the get_static_thumbnail tag reads them from. Run it after
+    collectstatic, which removes them with --clear.
+    """
+
+    help = "Generate the registered static thumbnails into STATIC_ROOT"
+
+    def handle(self, *args, **options):
+        try:
+            thumbnails = generate_static_thumbnails()
+        except FileNotFoundError as e:
+            raise CommandError("Static file not found: {}".format(e))
+        for key, thumbnail in thumbnails.items():
+            self.stdout.write("{} -> {}".format(key, thumbnail.url))
+        self.stdout.write(
+            "Wrote {} thumbnails to {}".format(len(thumbnails), MANIFEST_NAME)
+        )
@@ -0,0 +1,25 @@
+from blog.management.backfill import BackfillCommand
+from blog.models import BlogAuthor
+from blog.models import BlogPage
+
+
+class Command(BackfillCommand):
+    """
+    Fills the author index from the authors of all blog pages, and removes
+    authors that no page names anymore. Pages update their index when
+    they're saved, this is for the pages that existed before.
+    """
+
+    help = "Index the authors of all blog pages"
+
+    def handle(self, *args, **options):
+        self.backfill(
+            BlogPage.objects.all(),
+            lambda page: page.update_author_index(),
+            "Author index",
+            options["batch_size"],
+        )
+        removed, _ = BlogAuthor.objects.filter(page_index=None).delete()
+        self.stdout.write(
+            "{} authors indexed, {} removed".format(BlogAuthor.objects.count(), removed)
+        )
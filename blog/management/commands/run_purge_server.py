@@ -0,0 +1,72 @@
+import json
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+
+from django.core.management.base import BaseCommand
+
+
+class PurgeRequestHandler(BaseHTTPRequestHandler):
+    """
+    Accepts the purge requests of HTTPPurgeBackend and appends their keys to
+    server.purged.
+    """
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            keys = json.loads(self.rfile.read(length))["surrogate_keys"]
+        except (ValueError, KeyError, TypeError):
+            self.send_error(400, 'Expected {"surrogate_keys": [...]}')
+            return
+        self.server.purged.append(keys)
+        self.server.on_purge(keys)
+        body = json.dumps({"status": "ok"}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_purge_server(address, on_purge=lambda keys: None):
+    """
+    A stand-in for the purge endpoint, for development and tests. Call
+    serve_forever() on it, for instance in a thread, and set
+    MIGCONTROL_PURGE_URL to its address.
+    """
+    server = ThreadingHTTPServer(address, PurgeRequestHandler)
+    server.purged = []
+    server.on_purge = on_purge
+    return server
+
+
+class Command(BaseCommand):
+    """
+    Runs a stand-in for the purge endpoint of the proxy or CDN, which prints
+    the surrogate keys it receives. Point MIGCONTROL_PURGE_URL at it, e.g.
+    http://127.0.0.1:8099/, to see what publishing purges.
+    """
+
+    help = "Run a local purge endpoint that prints the surrogate keys it receives"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=8099)
+
+    def handle(self, *args, **options):
+        server = make_purge_server(
+            (options["host"], options["port"]),
+            on_purge=lambda keys: self.stdout.write("Purge: {}".format(" ".join(keys))),
+        )
+        self.stdout.write(
+            "Listening on http://{}:{}/".format(options["host"], options["port"])
+        )
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -0,0 +1,24 @@
+from blog.management.backfill import BackfillCommand
+from blog.models import BlogPage
+
+
+class Command(BackfillCommand):
+    """
+    Stores the excerpt of blog pages, which the blog index shows on its
+    cards. Saving a page does this automatically, this command is for pages
+    that were imported or saved before the field existed.
+    """
+
+    help = "Store the plain text excerpt of blog pages"
+
+    all_help = "Also recompute pages that already have an excerpt"
+
+    def handle(self, *args, **options):
+        pages = BlogPage.objects.all()
+        if not options["all"]:
+            pages = pages.filter(excerpt="")
+
+        def store_excerpt(page):
+            BlogPage.objects.filter(pk=page.pk).update(excerpt=page.make_excerpt())
+
+        self.backfill(pages, store_excerpt, "Excerpts", options["batch_size"])
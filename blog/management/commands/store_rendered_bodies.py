@@ -0,0 +1,35 @@
+from django.db.models import Q
+
+from blog.management.backfill import BackfillCommand
+from blog.models import BlogPage
+from migcontrol.rendering import get_tree_version
+from wiki.models import WikiPage
+
+
+class Command(BackfillCommand):
+    """
+    Renders the body of live blog and wiki pages and stores it in their
+    rendered_html, toc_json and rendered_tree_version fields. Publishing a
+    page does this automatically, this command is for pages that were
+    imported or published before the fields existed, and for pages whose
+    stored body is outdated since pages were moved, renamed or deleted.
+    """
+
+    help = "Store the rendered body and TOC of live blog and wiki pages"
+
+    all_help = "Also re-render pages that already have an up to date stored body"
+
+    def handle(self, *args, **options):
+        tree_version = get_tree_version()
+        for model in [BlogPage, WikiPage]:
+            pages = model.objects.live()
+            if not options["all"]:
+                pages = pages.filter(
+                    Q(toc_json__isnull=True) | ~Q(rendered_tree_version=tree_version)
+                )
+            self.backfill(
+                pages,
+                lambda page: page.store_rendered_body(),
+                model._meta.verbose_name,
+                options["batch_size"],
+            )
@@ -35,6 +35,7 @@ from blog.models import BlogPageTag
 from blog.models import BlogTag
 from blog.models import WordpressMapping
 from blog.wp_xml_parser import XML_parser
+from migcontrol.rendering import RenderedBodyMixin
 from wiki.models import WikiPage
 
 try:
@@ -531,7 +532,7 @@ class Command(BaseCommand):
         return new_body
 
     def create_footnotes_from_mfn_tags(self, page):
-        body = page.get_body()
+        body = page.render_body().html
         mfn_p = re.compile(r"\[mfn\](.+?)\[\/mfn\]", re.M)
         mfns = mfn_p.finditer(body)
         if not mfns:
@@ -649,7 +650,7 @@ class Command(BaseCommand):
         )
 
     def body_insert_wiki_links(self, page):
-        body = page.get_body()
+        body = page.render_body().html
         soup = BeautifulSoup(body, "html5lib")
 
         # Beautiful soup unfortunately adds some noise to the structure, so we
@@ -824,6 +825,8 @@ class Command(BaseCommand):
             self.create_categories_and_tags(page, categories)
             self.create_footnotes_from_mfn_tags(page)
             self.body_insert_wiki_links(page)
+            if page.live and isinstance(page, RenderedBodyMixin):
+                page.store_rendered_body()
 
             translation.activate(restore_locale)
 
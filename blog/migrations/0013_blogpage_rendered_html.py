@@ -0,0 +1,23 @@
+# Generated by Django 3.2.25 on 2026-10-17 20:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0012_alter_blogpage_body_mixed'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blogpage',
+            name='rendered_html',
+            field=models.TextField(blank=True, editable=False, help_text='The body with anchored headings, stored when published'),
+        ),
+        migrations.AddField(
+            model_name='blogpage',
+            name='toc_json',
+            field=models.JSONField(blank=True, editable=False, help_text='Headings of the body as [level, text, anchor], stored when published', null=True),
+        ),
+    ]
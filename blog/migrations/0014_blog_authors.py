@@ -0,0 +1,36 @@
+# Generated by Django 3.2.25 on 2026-10-17 20:57
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0013_blogpage_rendered_html'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BlogAuthor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255)),
+                ('slug', models.SlugField(allow_unicode=True, max_length=255, unique=True)),
+            ],
+            options={
+                'ordering': ['name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='BlogPageAuthor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='page_index', to='blog.blogauthor')),
+                ('page', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='author_index', to='blog.blogpage')),
+            ],
+            options={
+                'unique_together': {('author', 'page')},
+            },
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 3.2.25 on 2026-10-17 20:58
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def build_closure(apps, schema_editor):
+    BlogCategory = apps.get_model('blog.BlogCategory')
+    BlogCategoryClosure = apps.get_model('blog.BlogCategoryClosure')
+
+    parents = dict(BlogCategory.objects.values_list('pk', 'parent_id'))
+    links = []
+    for pk in parents:
+        # Walk up to the root, stopping at cycles the old clean() let through
+        ancestor_id, depth, seen = pk, 0, set()
+        while ancestor_id is not None and ancestor_id not in seen:
+            seen.add(ancestor_id)
+            links.append(BlogCategoryClosure(
+                ancestor_id=ancestor_id, descendant_id=pk, depth=depth))
+            ancestor_id, depth = parents.get(ancestor_id), depth + 1
+    BlogCategoryClosure.objects.bulk_create(links)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0014_blog_authors'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BlogCategoryClosure',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('depth', models.PositiveIntegerField()),
+                ('ancestor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='descendant_links', to='blog.blogcategory')),
+                ('descendant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ancestor_links', to='blog.blogcategory')),
+            ],
+            options={
+                'unique_together': {('ancestor', 'descendant')},
+            },
+        ),
+        migrations.RunPython(build_closure, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.2.25 on 2026-10-17 21:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0015_blogcategoryclosure'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='blogpage',
+            index=models.Index(fields=['date', 'page_ptr'], name='blogpage_date_id_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.25 on 2026-10-17 21:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0016_blogpage_date_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blogpage',
+            name='excerpt',
+            field=models.TextField(blank=True, editable=False, help_text='The first words of the body as plain text, stored when saved'),
+        ),
+    ]
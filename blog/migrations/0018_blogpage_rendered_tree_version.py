@@ -0,0 +1,18 @@
+# Generated by Django 3.2.25 on 2026-10-17 21:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0017_blogpage_excerpt'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blogpage',
+            name='rendered_tree_version',
+            field=models.CharField(blank=True, editable=False, help_text='The tree version the stored body was rendered with', max_length=32),
+        ),
+    ]
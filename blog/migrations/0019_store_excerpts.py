@@ -0,0 +1,26 @@
+from django.db import migrations
+
+from blog.management.backfill import backfill
+from blog.models import make_excerpt
+
+
+def store_excerpts(apps, schema_editor):
+    BlogPage = apps.get_model('blog.BlogPage')
+
+    def store_excerpt(page):
+        BlogPage.objects.filter(pk=page.pk).update(
+            excerpt=make_excerpt(page.body_richtext, page.body_mixed))
+
+    for _ in backfill(BlogPage.objects.filter(excerpt=''), store_excerpt, 100):
+        pass
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0018_blogpage_rendered_tree_version'),
+    ]
+
+    operations = [
+        migrations.RunPython(store_excerpts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+from django.db import migrations
+
+from blog.management.backfill import backfill
+from blog.models import split_authors
+
+
+def index_authors(apps, schema_editor):
+    BlogAuthor = apps.get_model('blog.BlogAuthor')
+    BlogPage = apps.get_model('blog.BlogPage')
+    BlogPageAuthor = apps.get_model('blog.BlogPageAuthor')
+
+    authors = {author.slug: author for author in BlogAuthor.objects.all()}
+    linked = set(BlogPageAuthor.objects.values_list('author_id', 'page_id'))
+
+    def index_page(page):
+        links = []
+        for slug, name in split_authors(page.authors).items():
+            if slug not in authors:
+                authors[slug] = BlogAuthor.objects.create(slug=slug, name=name)
+            if (authors[slug].pk, page.pk) not in linked:
+                links.append(BlogPageAuthor(author=authors[slug], page_id=page.pk))
+        BlogPageAuthor.objects.bulk_create(links)
+
+    for _ in backfill(BlogPage.objects.only('pk', 'authors'), index_page, 100):
+        pass
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0019_store_excerpts'),
+    ]
+
+    operations = [
+        migrations.RunPython(index_authors, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,7 @@
 import datetime
+import re
+from html import unescape
 
-from bs4 import BeautifulSoup
 from compressor.css import CssCompressor
 from django.conf import settings
 from django.contrib.auth import get_user_model
@@ -9,10 +10,19 @@ from django.core.paginator import EmptyPage
 from django.core.paginator import PageNotAnInteger
 from django.core.paginator import Paginator
 from django.db import models
+from django.db import transaction
 from django.db.models import Count
+from django.db.models import Q
+from django.db.models.signals import post_delete
+from django.db.models.signals import post_save
 from django.shortcuts import get_object_or_404
 from django.template.defaultfilters import slugify
+from django.utils.functional import SimpleLazyObject
+from django.utils.html import escape
 from django.utils.html import format_html
+from django.utils.html import strip_tags
+from django.utils.text import slugify as slugify_unicode
+from django.utils.text import Truncator
 from modelcluster.fields import ParentalKey
 from modelcluster.tags import ClusterTaggableManager
 from taggit.models import Tag
@@ -26,8 +36,8 @@ from wagtail.core import blocks
 from wagtail.core import hooks
 from wagtail.core.fields import RichTextField
 from wagtail.core.fields import StreamField
+from wagtail.core.models import Locale
 from wagtail.core.models import Page
-from wagtail.core.templatetags.wagtailcore_tags import richtext
 from wagtail.documents import get_document_model_string
 from wagtail.images import get_image_model_string
 from wagtail.images.blocks import ImageChooserBlock
@@ -37,40 +47,192 @@ from wagtail.snippets.models import register_snippet
 from wagtail_footnotes.blocks import RichTextBlockWithFootnotes
 
 from home.models import ArticleBase
-from migcontrol.utils import get_toc
+from migcontrol.conditional import ConditionalServeMixin
+from migcontrol.conditional import ListingConditionalServeMixin
+from migcontrol.pagination import AFTER
+from migcontrol.pagination import BEFORE
+from migcontrol.pagination import KeysetPaginator
+from migcontrol.rendering import bump_version
+from migcontrol.rendering import get_render_cache
+from migcontrol.rendering import get_version
+from migcontrol.rendering import RenderedBodyMixin
+from migcontrol.rendering import site_content_changed
+from migcontrol.richtext import richtext
+from migcontrol.stale import get_or_refresh
+from migcontrol.streamfield import render_stream
+from migcontrol.surrogate import add_surrogate_keys
+from migcontrol.surrogate import BLOG_CATEGORIES_KEY
+from migcontrol.surrogate import BLOG_PAGES_KEY
+from migcontrol.surrogate import get_blog_page_surrogate_keys
 
 # from django.utils.translation import ugettext_lazy as _
 
 
 COMMENTS_APP = getattr(settings, "COMMENTS_APP", None)
 
+# Seconds until the cached blog taxonomy and feeds are refreshed, and
+# until they're dropped, unless the blog version changes first. See
+# migcontrol/stale.py
+BLOG_CACHE_SOFT_TTL = getattr(settings, "BLOG_CACHE_SOFT_TTL", 60)
+BLOG_CACHE_HARD_TTL = getattr(settings, "BLOG_CACHE_HARD_TTL", 60 * 60)
 
-def get_blog_context(context):
-    """Get context data useful on all blog related pages"""
-    context["authors"] = (
-        get_user_model()
-        .objects.filter(
-            owned_pages__live=True, owned_pages__content_type__model="blogpage"
-        )
-        .annotate(Count("owned_pages"))
-        .order_by("-owned_pages__count")
+# Length of BlogPage.excerpt, shown on the cards of the blog index
+EXCERPT_WORDS = 30
+
+# "keyset" pages through the blog with ?after= and ?before= cursors, see
+# migcontrol/pagination.py. "paginator" uses numbered ?page= pages, which are
+# also used for requests that have a page parameter.
+BLOG_PAGINATION_MODE = getattr(settings, "BLOG_PAGINATION_MODE", "keyset")
+
+
+BLOG_VERSION_KEY = "migcontrol:blog-version"
+
+
+def get_blog_version():
+    return get_version(BLOG_VERSION_KEY)
+
+
+def get_cached_blog_data(key, compute):
+    """
+    compute(), cached with stale-while-revalidate until the blog version
+    changes.
+    """
+    return get_or_refresh(
+        get_render_cache(),
+        key,
+        compute,
+        soft_ttl=BLOG_CACHE_SOFT_TTL,
+        hard_ttl=BLOG_CACHE_HARD_TTL,
+        version=get_blog_version(),
     )
-    context["all_categories"] = BlogCategory.objects.all()
-    context["root_categories"] = (
-        BlogCategory.objects.filter(
-            parent=None,
-        )
-        .prefetch_related(
-            "children",
+
+
+class BlogTaxonomy:
+    """
+    Authors and categories of the blog posts in one locale, for the sidebar
+    and the category filter.
+
+    authors are users with their number of posts as owned_pages__count, most
+    posts first. categories are all categories by name, each with its number
+    of posts as blog_count and its child categories as subcategories.
+    """
+
+    def __init__(self, authors, categories):
+        self.authors = authors
+        self.categories = categories
+
+    @property
+    def root_categories(self):
+        return [category for category in self.categories if category.parent_id is None]
+
+    @classmethod
+    def build(cls, locale):
+        authors = list(
+            get_user_model()
+            .objects.filter(
+                owned_pages__live=True,
+                owned_pages__content_type__model="blogpage",
+                owned_pages__locale=locale,
+            )
+            .annotate(Count("owned_pages"))
+            .order_by("-owned_pages__count")
         )
-        .annotate(
-            blog_count=Count("blogpage"),
+        categories = list(
+            BlogCategory.objects.annotate(
+                blog_count=Count(
+                    "blogpage",
+                    filter=Q(blogpage__live=True, blogpage__locale=locale),
+                )
+            )
         )
+        by_id = {category.pk: category for category in categories}
+        for category in categories:
+            category.subcategories = []
+        for category in categories:
+            if category.parent_id in by_id:
+                by_id[category.parent_id].subcategories.append(category)
+        return cls(authors, categories)
+
+
+def get_blog_taxonomy(locale=None):
+    """
+    The BlogTaxonomy of the locale, by default the active one. It's cached
+    until a page is published or a category changes, see
+    get_cached_blog_data().
+    """
+    locale = locale or Locale.get_active()
+    return get_cached_blog_data(
+        "migcontrol:blog:taxonomy:{}".format(locale.pk),
+        lambda: BlogTaxonomy.build(locale),
     )
+
+
+def get_blog_context(context):
+    """Get context data useful on all blog related pages"""
+    # Only loaded when the template uses it
+    taxonomy = SimpleLazyObject(get_blog_taxonomy)
+    context["authors"] = SimpleLazyObject(lambda: taxonomy.authors)
+    context["all_categories"] = SimpleLazyObject(lambda: taxonomy.categories)
+    context["root_categories"] = SimpleLazyObject(lambda: taxonomy.root_categories)
+    add_surrogate_keys(context.get("request"), [BLOG_PAGES_KEY, BLOG_CATEGORIES_KEY])
     return context
 
 
-class BlogIndexPage(ArticleBase, Page):
+def pagination_query(request, **params):
+    """
+    The query string of the request with the pagination parameters replaced
+    by params.
+    """
+    query = request.GET.copy()
+    for param in ("page", AFTER, BEFORE):
+        query.pop(param, None)
+    query.update(params)
+    return query.urlencode()
+
+
+def paginate_posts(request, posts):
+    """
+    Returns the page of the posts the request asks for, and the query strings
+    of the pages with older and newer posts, or None. See
+    BLOG_PAGINATION_MODE.
+    """
+    page_size = getattr(settings, "BLOG_PAGINATION_PER_PAGE", 12)
+    if page_size is None:
+        return posts, None, None
+    if BLOG_PAGINATION_MODE == "paginator" or "page" in request.GET:
+        # Numbered pages, and old ?page= links
+        return paginate_numbered(request, posts, page_size)
+    return paginate_keyset(request, posts, page_size)
+
+
+def paginate_numbered(request, posts, page_size):
+    paginator = Paginator(posts, page_size)
+    try:
+        page = paginator.page(request.GET.get("page"))
+    except PageNotAnInteger:
+        page = paginator.page(1)
+    except EmptyPage:
+        page = paginator.page(paginator.num_pages)
+    older_query = newer_query = None
+    if page.has_next():
+        older_query = pagination_query(request, page=page.next_page_number())
+    if page.has_previous():
+        newer_query = pagination_query(request, page=page.previous_page_number())
+    return page, older_query, newer_query
+
+
+def paginate_keyset(request, posts, page_size):
+    paginator = KeysetPaginator(posts, page_size, "date")
+    page = paginator.page(request.GET.get(AFTER), request.GET.get(BEFORE))
+    older_query = newer_query = None
+    if page.has_next():
+        older_query = pagination_query(request, **{AFTER: page.next_cursor})
+    if page.has_previous():
+        newer_query = pagination_query(request, **{BEFORE: page.previous_cursor})
+    return page, older_query, newer_query
+
+
+class BlogIndexPage(ListingConditionalServeMixin, ArticleBase, Page):
     template = "blog/index.html"
 
     @property
@@ -79,7 +241,7 @@ class BlogIndexPage(ArticleBase, Page):
         # belong to for now, as blogs are not language sensitive
         blogs = BlogPage.objects.all().live()
         blogs = (
-            blogs.order_by("-date")
+            blogs.order_by("-date", "-pk")
             .select_related("owner")
             .prefetch_related(
                 "tagged_items__tag",
@@ -89,7 +251,10 @@ class BlogIndexPage(ArticleBase, Page):
         )
         return blogs
 
-    def get_context(  # noqa: max-complexity=14
+    def get_listed_pages(self):
+        return BlogPage.objects.live()
+
+    def get_context(
         self,
         request,
         tag=None,
@@ -114,35 +279,27 @@ class BlogIndexPage(ArticleBase, Page):
         if category:
             if not request.GET.get("category"):
                 category = get_object_or_404(BlogCategory, slug=category)
-            blogs = blogs.filter(categories__category__name=category)
+            blogs = blogs.filter(pk__in=category.get_blog_page_ids())
         if author:
-            blogs = blogs.filter(authors__icontains=author)
+            blogs = blogs.filter(author_index__author__slug=author_slug(author))
         if locale:
             blogs = blogs.filter(locale=locale)
 
-        # Pagination
-        page = request.GET.get("page")
-        page_size = 12
-        if hasattr(settings, "BLOG_PAGINATION_PER_PAGE"):
-            page_size = settings.BLOG_PAGINATION_PER_PAGE
-
-        if page_size is not None:
-            paginator = Paginator(blogs, page_size)  # Show 10 blogs per page
-            try:
-                blogs = paginator.page(page)
-            except PageNotAnInteger:
-                blogs = paginator.page(1)
-            except EmptyPage:
-                blogs = paginator.page(paginator.num_pages)
+        blogs, older_query, newer_query = paginate_posts(request, blogs)
+
+        for blog in blogs:
+            add_surrogate_keys(request, get_blog_page_surrogate_keys(blog))
 
         context["blogs"] = blogs
+        context["older_query"] = older_query
+        context["newer_query"] = newer_query
         context["category"] = category
         context["locale"] = locale
-        context["categories"] = BlogCategory.objects.all()
         context["tag"] = tag
         context["author"] = author
         context["COMMENTS_APP"] = COMMENTS_APP
         context = get_blog_context(context)
+        context["categories"] = context["all_categories"]
 
         return context
 
@@ -186,10 +343,12 @@ class BlogCategory(models.Model):
 
     def clean(self):
         if self.parent:
-            parent = self.parent
             if self.parent == self:
                 raise ValidationError("Parent category cannot be self.")
-            if parent.parent and parent.parent == self:
+            if (
+                self.pk
+                and self.descendant_links.filter(descendant=self.parent).exists()
+            ):
                 raise ValidationError("Cannot have circular Parents.")
 
     def save(self, *args, **kwargs):
@@ -199,7 +358,74 @@ class BlogCategory(models.Model):
             if count > 0:
                 slug = "{}-{}".format(slug, count)
             self.slug = slug
-        return super(BlogCategory, self).save(*args, **kwargs)
+        with transaction.atomic():
+            old_parent_id = (
+                BlogCategory.objects.filter(pk=self.pk)
+                .values_list("parent_id", flat=True)
+                .first()
+            )
+            created = self._state.adding
+            result = super(BlogCategory, self).save(*args, **kwargs)
+            if created:
+                BlogCategoryClosure.objects.create(
+                    ancestor=self, descendant=self, depth=0
+                )
+            if created or old_parent_id != self.parent_id:
+                self.move_closure()
+        return result
+
+    def move_closure(self):
+        """
+        Links the category and its descendants to the ancestors of its
+        current parent, instead of those of its old parent. Rows for deleted
+        categories are removed by the cascade.
+        """
+        descendant_links = list(self.descendant_links.all())
+        BlogCategoryClosure.objects.filter(
+            descendant__in=[link.descendant_id for link in descendant_links]
+        ).exclude(
+            ancestor__in=[link.descendant_id for link in descendant_links]
+        ).delete()
+        if self.parent_id is None:
+            return
+        BlogCategoryClosure.objects.bulk_create(
+            BlogCategoryClosure(
+                ancestor_id=ancestor_link.ancestor_id,
+                descendant_id=link.descendant_id,
+                depth=ancestor_link.depth + 1 + link.depth,
+            )
+            for ancestor_link in BlogCategoryClosure.objects.filter(
+                descendant_id=self.parent_id
+            )
+            for link in descendant_links
+        )
+
+    def get_blog_page_ids(self):
+        """
+        The ids of the blog pages in the category or any of its
+        subcategories, as a subquery.
+        """
+        return BlogCategoryBlogPage.objects.filter(
+            category__ancestor_links__ancestor=self
+        ).values("page_id")
+
+
+class BlogCategoryClosure(models.Model):
+    """
+    One row for every category and each of its ancestors, and for the
+    category itself with depth 0. Maintained by BlogCategory.save().
+    """
+
+    ancestor = models.ForeignKey(
+        BlogCategory, related_name="descendant_links", on_delete=models.CASCADE
+    )
+    descendant = models.ForeignKey(
+        BlogCategory, related_name="ancestor_links", on_delete=models.CASCADE
+    )
+    depth = models.PositiveIntegerField()
+
+    class Meta:
+        unique_together = [("ancestor", "descendant")]
 
 
 class BlogCategoryBlogPage(models.Model):
@@ -219,6 +445,56 @@ class BlogPageTag(TaggedItemBase):
     content_object = ParentalKey("BlogPage", related_name="tagged_items")
 
 
+# Separate the names in BlogPage.authors
+AUTHORS_SEPARATOR = re.compile(r"\s*(?:[,;&]|\band\b)\s*", re.IGNORECASE)
+
+
+def split_authors(authors):
+    """
+    {slug: name} of the authors in the free text of BlogPage.authors, in
+    order. Names with the same slug are the same author.
+    """
+    names = {}
+    for name in AUTHORS_SEPARATOR.split(authors or ""):
+        slug = author_slug(name)
+        if slug and slug not in names:
+            names[slug] = name
+    return names
+
+
+def author_slug(name):
+    return slugify_unicode(name, allow_unicode=True)
+
+
+class BlogAuthor(models.Model):
+    """
+    An author named in BlogPage.authors. The author index is filled when a
+    blog page is saved, and for the pages that existed before by a
+    migration. The index_blog_authors command rebuilds it.
+    """
+
+    name = models.CharField(max_length=255)
+    slug = models.SlugField(unique=True, max_length=255, allow_unicode=True)
+
+    class Meta:
+        ordering = ["name"]
+
+    def __str__(self):
+        return self.name
+
+
+class BlogPageAuthor(models.Model):
+    author = models.ForeignKey(
+        BlogAuthor, related_name="page_index", on_delete=models.CASCADE
+    )
+    page = models.ForeignKey(
+        "BlogPage", related_name="author_index", on_delete=models.CASCADE
+    )
+
+    class Meta:
+        unique_together = [("author", "page")]
+
+
 def limit_author_choices():
     """Legacy function to appease migration error."""
     return None
@@ -230,7 +506,25 @@ class BlogTag(Tag):
         proxy = True
 
 
-class BlogPage(Page):
+def make_excerpt(body_richtext, body_mixed):
+    """
+    The first EXCERPT_WORDS words of the body of a BlogPage as plain text,
+    like |richtext|striptags|truncatewords_html gave, but from the source, so
+    links and embeds aren't expanded. Also used by the migration that fills
+    in the excerpts.
+    """
+    if body_richtext:
+        source = body_richtext
+    else:
+        source = " ".join(
+            escape(block["value"]) if block["type"] == "heading" else block["value"]
+            for block in body_mixed.raw_data
+            if block["type"] in ("heading", "paragraph")
+        )
+    return unescape(Truncator(strip_tags(source)).words(EXCERPT_WORDS, html=True))
+
+
+class BlogPage(RenderedBodyMixin, ConditionalServeMixin, Page):
     body_richtext = RichTextField(
         verbose_name=("body (HTML)"),
         blank=True,
@@ -300,6 +594,29 @@ class BlogPage(Page):
         help_text="Mention author(s) by the name to be displayed",
     )
 
+    rendered_html = models.TextField(
+        blank=True,
+        editable=False,
+        help_text="The body with anchored headings, stored when published",
+    )
+    toc_json = models.JSONField(
+        blank=True,
+        null=True,
+        editable=False,
+        help_text="Headings of the body as [level, text, anchor], stored when published",
+    )
+    rendered_tree_version = models.CharField(
+        max_length=32,
+        blank=True,
+        editable=False,
+        help_text="The tree version the stored body was rendered with",
+    )
+    excerpt = models.TextField(
+        blank=True,
+        editable=False,
+        help_text="The first words of the body as plain text, stored when saved",
+    )
+
     search_fields = Page.search_fields + [
         index.SearchField("body_richtext"),
         index.SearchField("body_mixed"),
@@ -326,35 +643,52 @@ class BlogPage(Page):
         FieldPanel("authors"),
     ]
 
-    def get_body(self):
+    def expand_body(self):
         if self.body_richtext:
-            body = richtext(self.body_richtext)
-        else:
-            body = "".join([str(f.value) for f in self.body_mixed])
+            return richtext(self.body_richtext)
+        return "".join(render_stream(self, self.body_mixed, use_cache=False))
 
-        # Now let's add some id=... attributes to all h{1,2,3,4,5}
-        soup = BeautifulSoup(body, "html5lib")
-
-        # Beautiful soup unfortunately adds some noise to the structure, so we
-        # remove this again - see:
-        # https://stackoverflow.com/questions/21452823/beautifulsoup-how-should-i-obtain-the-body-contents
-        for attr in ["head", "html", "body"]:
-            if hasattr(soup, attr):
-                getattr(soup, attr).unwrap()
-
-        for element in soup.find_all(["h1", "h2", "h3", "h4", "h5"]):
-            element["id"] = "header-" + slugify(element.text)
-
-        return str(soup)
+    def save_revision(self, *args, **kwargs):
+        return super(BlogPage, self).save_revision(*args, **kwargs)
 
-    def get_toc(self):
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get("update_fields")
+        if update_fields is None or {"body_richtext", "body_mixed"} & set(
+            update_fields
+        ):
+            self.excerpt = self.make_excerpt()
+            if update_fields is not None:
+                kwargs["update_fields"] = set(update_fields) | {"excerpt"}
+        result = super().save(*args, **kwargs)
+        if update_fields is None or "authors" in update_fields:
+            self.update_author_index()
+        return result
+
+    def make_excerpt(self):
+        return make_excerpt(self.body_richtext, self.body_mixed)
+
+    def update_author_index(self):
         """
-        [(name, [*children])]
+        Links the page to the BlogAuthors named in authors, creating the
+        missing ones.
         """
-        return get_toc(self.get_body())
+        names = split_authors(self.authors)
+        authors = {
+            author.slug: author for author in BlogAuthor.objects.filter(slug__in=names)
+        }
+        for slug, name in names.items():
+            if slug not in authors:
+                authors[slug], _ = BlogAuthor.objects.get_or_create(
+                    slug=slug, defaults={"name": name}
+                )
 
-    def save_revision(self, *args, **kwargs):
-        return super(BlogPage, self).save_revision(*args, **kwargs)
+        self.author_index.exclude(author__slug__in=names).delete()
+        linked = set(self.author_index.values_list("author_id", flat=True))
+        BlogPageAuthor.objects.bulk_create(
+            BlogPageAuthor(author=author, page=self)
+            for author in authors.values()
+            if author.pk not in linked
+        )
 
     def get_absolute_url(self):
         return self.url
@@ -366,6 +700,7 @@ class BlogPage(Page):
     def get_context(self, request, *args, **kwargs):
         context = super(BlogPage, self).get_context(request, *args, **kwargs)
         context["blogs"] = self.get_blog_index().blogindexpage.blogs
+        add_surrogate_keys(request, get_blog_page_surrogate_keys(self))
         context = get_blog_context(context)
         context["COMMENTS_APP"] = COMMENTS_APP
         return context
@@ -373,6 +708,10 @@ class BlogPage(Page):
     class Meta:
         verbose_name = "Blog page"
         verbose_name_plural = "Blog pages"
+        indexes = [
+            # Keyset pagination, see BlogIndexPage.get_context()
+            models.Index(fields=["date", "page_ptr"], name="blogpage_date_id_idx"),
+        ]
 
     parent_page_types = ["blog.BlogIndexPage"]
 
@@ -436,6 +775,15 @@ BlogPage.content_panels = [
 ]
 
 
+def invalidate_blog_data_handler(sender, **kwargs):
+    bump_version(BLOG_VERSION_KEY)
+
+
+site_content_changed.connect(invalidate_blog_data_handler)
+post_save.connect(invalidate_blog_data_handler, sender=BlogCategory)
+post_delete.connect(invalidate_blog_data_handler, sender=BlogCategory)
+
+
 @hooks.register("insert_global_admin_css")
 def import_fontawesome_stylesheet():
     elem = '<link rel="stylesheet" type="text/x-scss" href="{}scss/fontawesome.scss">'.format(
@@ -1,12 +1,18 @@
 from django.conf import settings
 from django.contrib.syndication.views import Feed
 from django.shortcuts import get_object_or_404
+from django.utils import translation
 from django.utils.feedgenerator import Atom1Feed
 from wagtail.core.models.i18n import Locale
 
 from .models import BlogCategory
 from .models import BlogIndexPage
 from .models import BlogPage
+from .models import get_cached_blog_data
+from migcontrol.surrogate import add_surrogate_keys
+from migcontrol.surrogate import BLOG_PAGES_KEY
+from migcontrol.surrogate import category_key
+from migcontrol.surrogate import page_key
 
 
 def tag_view(request, tag):
@@ -30,14 +36,35 @@ def author_view(request, author):
     return index.serve(request, author=author)
 
 
-class LatestEntriesFeed(Feed):
+class CachedFeedMixin:
+    """
+    Caches the generated feed per object, URL scheme, host and language, see
+    get_cached_blog_data().
+    """
+
+    def get_feed(self, obj, request):
+        key = "migcontrol:feed:{}:{}:{}:{}:{}".format(
+            type(self).__name__,
+            obj.pk,
+            request.scheme,
+            request.get_host(),
+            translation.get_language(),
+        )
+        return get_cached_blog_data(
+            key, lambda: super(CachedFeedMixin, self).get_feed(obj, request)
+        )
+
+
+class LatestEntriesFeed(CachedFeedMixin, Feed):
     """
     If a URL ends with "rss" try to find a matching BlogIndexPage
     and return its items.
     """
 
     def get_object(self, request, blog_slug):
-        return get_object_or_404(BlogIndexPage, slug=blog_slug)
+        blog = get_object_or_404(BlogIndexPage, slug=blog_slug)
+        add_surrogate_keys(request, [page_key(blog.pk), BLOG_PAGES_KEY])
+        return blog
 
     def title(self, blog):
         if blog.seo_title:
@@ -71,7 +98,7 @@ class LatestEntriesFeedAtom(LatestEntriesFeed):
     feed_type = Atom1Feed
 
 
-class LatestCategoryFeed(Feed):
+class LatestCategoryFeed(CachedFeedMixin, Feed):
     description = "A Blog"
 
     def title(self, category):
@@ -81,10 +108,14 @@ class LatestCategoryFeed(Feed):
         return "/blog/category/" + category.slug
 
     def get_object(self, request, category):
-        return get_object_or_404(BlogCategory, slug=category)
+        category = get_object_or_404(BlogCategory, slug=category)
+        add_surrogate_keys(request, [category_key(category.pk), BLOG_PAGES_KEY])
+        return category
 
     def items(self, obj):
-        return BlogPage.objects.filter(categories__category=obj).order_by("-date")[:5]
+        return BlogPage.objects.filter(pk__in=obj.get_blog_page_ids()).order_by(
+            "-date"
+        )[:5]
 
     def item_title(self, item):
         return item.title
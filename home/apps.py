@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class ArchiveConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "home"
+
+    def ready(self):
+        # Connects the signal handlers that invalidate the cached menus,
+        # language chooser URLs and pages, and purge the proxy in front
+        from migcontrol import navigation  # noqa: F401
+        from migcontrol import pagecache  # noqa: F401
+        from migcontrol import surrogate  # noqa: F401
+        from migcontrol import translations  # noqa: F401
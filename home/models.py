@@ -6,6 +6,8 @@ from wagtail.core.fields import StreamField
 from wagtail.core.models import Page
 from wagtail.images.blocks import ImageChooserBlock
 
+from migcontrol.conditional import ConditionalServeMixin
+
 
 class HomePage(Page):
     """
@@ -49,7 +51,7 @@ class ArticleBase(models.Model):
         abstract = True
 
 
-class Article(ArticleBase, Page):
+class Article(ConditionalServeMixin, ArticleBase, Page):
     """
     We are using this model as a default article page. This covers the following
     page types:
@@ -1,32 +1,43 @@
-import re
+import hashlib
 
 from django import template
 from django.contrib.staticfiles import finders
-from django.core.exceptions import ValidationError
-from django.core.files.storage import FileSystemStorage
 from django.utils.safestring import mark_safe
 from sorl.thumbnail import get_thumbnail
 from wagtail.core.models import Page
 from wagtail.core.models import Site
 from wagtail.core.templatetags.wagtailcore_tags import pageurl
 
+from migcontrol.footnotes import render_footnotes
+from migcontrol.memo import language_key
+from migcontrol.memo import memoize_per_request
+from migcontrol.navigation import get_navigation_menu as get_site_navigation_menu
+from migcontrol.rendering import cached_render
+from migcontrol.streamfield import render_stream
+from migcontrol.thumbnails import get_static_thumbnail as get_generated_static_thumbnail
+from migcontrol.thumbnails import source_storage
+from migcontrol.thumbnails import StaticPath
+from migcontrol.translations import get_language_urls
+from migcontrol.utils import render_toc as render_toc_html
+
 
 register = template.Library()
 
 
 @register.simple_tag(takes_context=False)
-def page_url_localized_fallback(localized_page, target_language):
-    if (
-        localized_page.locale.language_code != target_language
-        and localized_page.get_parent()
-    ):
-        return page_url_localized_fallback(
-            localized_page.get_parent().localized, target_language
-        )
-    return localized_page.url
+def page_url_localized_fallback(page, target_language):
+    """
+    example: {% page_url_localized_fallback page "de" %}
+
+    Returns the URL of the translation of the page in the target language,
+    or of its nearest ancestor that is translated. See
+    migcontrol.translations.
+    """
+    return get_language_urls(page).get(target_language)
 
 
 @register.simple_tag(takes_context=True)
+@memoize_per_request(key=language_key)
 def slugurl_localized(context, slug):
     """
     A language-aware version of Wagtail's slugurl tag
@@ -57,22 +68,23 @@ def slugurl_localized(context, slug):
         return pageurl(context, page.localized)
 
 
-class StaticPath(str):
-    def __new__(cls, path: str, storage: FileSystemStorage):
-        obj = super().__new__(cls, path)
-        obj.storage = storage
-        return obj
-
-
-storage = FileSystemStorage(location="/")
-
-
 @register.simple_tag(takes_context=False)
 def get_static_thumbnail(file_: str, geometry, *args, **kwargs):
+    """
+    example: {% get_static_thumbnail "images/logo.png" "300x100" format="PNG" as im %}
+
+    Returns the thumbnail generated by the generate_static_thumbnails
+    command when it's registered in MIGCONTROL_STATIC_THUMBNAILS, see
+    migcontrol.thumbnails. Otherwise it's created with sorl-thumbnail on
+    the fly.
+    """
+    thumbnail = get_generated_static_thumbnail(file_, geometry, kwargs)
+    if thumbnail is not None:
+        return thumbnail
     disk_path = finders.find(file_)
     if disk_path:
         return get_thumbnail(
-            StaticPath(disk_path, storage),
+            StaticPath(disk_path, source_storage),
             geometry,
             *args,
             **kwargs,
@@ -80,6 +92,7 @@ def get_static_thumbnail(file_: str, geometry, *args, **kwargs):
 
 
 @register.simple_tag(takes_context=True)
+@memoize_per_request(key=language_key)
 def get_site_root(context):
     # This returns a core.Page. The main menu needs to have the site.root_page
     # defined else will return an object attribute error ('str' object has no
@@ -87,8 +100,20 @@ def get_site_root(context):
     return Site.find_for_request(context["request"]).root_page.localized
 
 
-@register.simple_tag(takes_context=False)
-def get_page_by_slug(parent, slug):
+@register.simple_tag(takes_context=True)
+def get_navigation_menu(context):
+    """
+    example: {% get_navigation_menu as menu %}
+
+    Returns the cached NavigationMenu of the current site in the active
+    language, see migcontrol.navigation.
+    """
+    return get_site_navigation_menu(Site.find_for_request(context["request"]))
+
+
+@register.simple_tag(takes_context=True)
+@memoize_per_request(key=lambda context, parent, slug: (parent.pk, slug))
+def get_page_by_slug(context, parent, slug):
     # This returns a core.Page. The main menu needs to have the site.root_page
     # defined else will return an object attribute error ('str' object has no
     # attribute 'get_children')
@@ -102,30 +127,63 @@ def richtext_footnotes(context, html):
 
     html: already processed richtext field html
     Assumes "page" in context.
-    """
-    FIND_FOOTNOTE_TAG = re.compile(r'<footnote id="(.*?)">.*?</footnote>')
 
+    The rewritten html and the page's footnotes are cached per published
+    revision of the page, the footnotes are put in page.footnotes_list for
+    the footnotes.html include.
+    """
     if not isinstance(context.get("page"), Page):
         return html
 
     page = context["page"]
-    if not hasattr(page, "footnotes_list"):
-        page.footnotes_list = []
-    footnotes = {str(footnote.uuid): footnote for footnote in page.footnotes.all()}
-
-    def replace_tag(match):
-        try:
-            index = process_footnote(match.group(1), page)
-        except (KeyError, ValidationError):
-            return ""
-        else:
-            return f'<a href="#footnote-{index}" id="footnote-source-{index}"><sup>[{index}]</sup></a>'
-
-    def process_footnote(footnote_id, page):
-        footnote = footnotes[footnote_id]
-        if footnote not in page.footnotes_list:
-            page.footnotes_list.append(footnote)
-        # Add 1 to the index as footnotes are indexed starting at 1 not 0.
-        return page.footnotes_list.index(footnote) + 1
-
-    return mark_safe(FIND_FOOTNOTE_TAG.sub(replace_tag, html))
+
+    def render():
+        return render_footnotes(html, page.footnotes.all())
+
+    if getattr(context.get("request"), "is_preview", False):
+        html, page.footnotes_list = render()
+    else:
+        html, page.footnotes_list = cached_render(
+            page,
+            "footnotes",
+            render,
+            variant=hashlib.md5(html.encode()).hexdigest(),
+        )
+
+    return mark_safe(html)
+
+
+@register.simple_tag(takes_context=True)
+def render_toc(context, toc, page=None):
+    """
+    example: {% render_toc page.get_toc page=page %}
+
+    Renders the TOC as nested <nav> elements. When the page the TOC belongs
+    to is given, the output is cached per published revision of the page,
+    next to its body.
+    """
+    if page is None or getattr(context.get("request"), "is_preview", False):
+        return render_toc_html(toc)
+    return cached_render(page, "toc", lambda: render_toc_html(toc))
+
+
+@register.simple_tag(takes_context=True)
+def render_streamfield(context, stream_value, page=None):
+    """
+    example: {% render_streamfield page.body page=page %}
+
+    Renders all blocks of a StreamField like looping over it with
+    {% include_block %}, with the references of all blocks loaded at once.
+    When the page the StreamField belongs to is given, the rendered blocks
+    are cached per published revision of the page.
+    """
+    is_preview = getattr(context.get("request"), "is_preview", False)
+    if page is None:
+        page = context.get("page")
+    blocks = render_stream(
+        page,
+        stream_value,
+        context=context.flatten(),
+        use_cache=isinstance(page, Page) and not is_preview,
+    )
+    return mark_safe("\n".join(blocks))
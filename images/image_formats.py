@@ -1,7 +1,46 @@
 from django.utils.html import escape
+from wagtail.images import get_image_model
 from wagtail.images.formats import Format
 from wagtail.images.formats import register_image_format
 from wagtail.images.formats import unregister_image_format
+from wagtail.images.models import Filter
+
+
+def prefetch_renditions(images, filter_specs):
+    """
+    Loads the existing renditions of the images for the filter specs with one
+    query, and puts them in image.prefetched_renditions where
+    CaptionedImageFormat picks them up instead of querying per image.
+    """
+    if not images or not filter_specs:
+        return
+    Rendition = get_image_model().get_rendition_model()
+    renditions = {
+        (rendition.image_id, rendition.filter_spec, rendition.focal_point_key): (
+            rendition
+        )
+        for rendition in Rendition.objects.filter(
+            image__in=images, filter_spec__in=filter_specs
+        )
+    }
+    for image in images:
+        image.prefetched_renditions = {}
+        for filter_spec in filter_specs:
+            rendition = renditions.get(
+                (image.id, filter_spec, Filter(spec=filter_spec).get_cache_key(image))
+            )
+            if rendition is not None:
+                rendition.image = image
+                image.prefetched_renditions[filter_spec] = rendition
+
+
+def get_prefetched_rendition(image, filter_spec):
+    """
+    Returns the rendition put in image.prefetched_renditions by
+    prefetch_renditions(), or None when it wasn't prefetched or doesn't exist
+    yet.
+    """
+    return getattr(image, "prefetched_renditions", {}).get(filter_spec)
 
 
 class CaptionedImageFormat(Format):
@@ -11,8 +50,15 @@ class CaptionedImageFormat(Format):
         attrs["contenteditable"] = "false"
         return attrs
 
+    def get_rendition(self, image):
+        rendition = get_prefetched_rendition(image, self.filter_spec)
+        if rendition is not None:
+            return rendition
+        # Not generated yet, or the image wasn't prefetched
+        return image.get_rendition(self.filter_spec)
+
     def image_to_html(self, image, alt_text, extra_attributes=""):
-        rendition = image.get_rendition(self.filter_spec)
+        rendition = self.get_rendition(image)
 
         if self.classnames:
             class_attr = 'class="%s" ' % escape(self.classnames)
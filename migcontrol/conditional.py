@@ -0,0 +1,163 @@
+"""
+Conditional GET for pages.
+
+Pages with ConditionalServeMixin send ETag and Last-Modified headers, and
+answer a matching If-None-Match with 304 Not Modified before get_context()
+and the template run. The ETag identifies the published revision of the
+page, the active language, the navigation menus and page URLs (the site
+version that the page cache bumps for them) and the deployed code, see
+get_build_id(). Listing pages use ListingConditionalServeMixin, which also
+covers the pages they list.
+
+Publishing any other page doesn't change it, so a page isn't sent again
+whenever something is published. What the page shows of other pages
+besides the menus, like the language chooser or the blog sidebar, is only
+sent again along with a change of the page itself, the site version or the
+code.
+
+Last-Modified only covers the revision, so If-Modified-Since alone is never
+answered with 304.
+
+Logged in users and previews always get the full response, as what they see
+doesn't only depend on the published revision.
+"""
+import functools
+import hashlib
+import os
+
+from django.apps import apps
+from django.conf import settings
+from django.db.models import Count
+from django.db.models import Max
+from django.utils import translation
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from migcontrol.pagecache import get_site_version
+
+
+# Identifies the deployed code, see get_build_id()
+BUILD_ID = getattr(settings, "MIGCONTROL_BUILD_ID", None)
+
+BUILD_FILE_EXTENSIONS = {".css", ".html", ".js", ".py", ".scss", ".txt"}
+
+
+@functools.lru_cache()
+def get_build_id():
+    """
+    MIGCONTROL_BUILD_ID, or else a digest of the code, templates and static
+    sources of the project and its apps, computed once per process. It
+    changes with every deploy that can change what the pages look like.
+    """
+    if BUILD_ID:
+        return BUILD_ID
+    roots = [settings.PROJECT_DIR] + [
+        app_config.path
+        for app_config in apps.get_app_configs()
+        if app_config.path.startswith(settings.BASE_DIR + os.sep)
+    ]
+    digest = hashlib.md5()
+    for root in sorted(set(roots)):
+        for directory, directories, files in os.walk(root):
+            directories[:] = sorted(
+                name for name in directories if name != "__pycache__"
+            )
+            for name in sorted(files):
+                if os.path.splitext(name)[1] not in BUILD_FILE_EXTENSIONS:
+                    continue
+                path = os.path.join(directory, name)
+                digest.update(os.path.relpath(path, settings.BASE_DIR).encode())
+                with open(path, "rb") as file_:
+                    digest.update(file_.read())
+    return digest.hexdigest()
+
+
+def make_etag(*parts):
+    """
+    A strong ETag from the parts.
+    """
+    digest = hashlib.md5(":".join(str(part) for part in parts).encode()).hexdigest()
+    return '"{}"'.format(digest)
+
+
+def is_conditional_request(request):
+    if request.method not in ("GET", "HEAD"):
+        return False
+    if getattr(request, "is_preview", False):
+        return False
+    user = getattr(request, "user", None)
+    return user is None or not user.is_authenticated
+
+
+class ConditionalServeMixin:
+    """
+    Mixin for Page models, see the module docstring.
+    """
+
+    def get_content_versions(self):
+        """
+        Versions of what the page shows besides its own revision.
+        """
+        return [get_site_version(), get_build_id()]
+
+    def get_validators(self, request, *args, **kwargs):
+        """
+        Returns (etag, last_modified), or (None, None) if the page can't be
+        validated.
+        """
+        if not self.last_published_at:
+            return None, None
+        etag = make_etag(
+            self.pk,
+            self.live_revision_id,
+            self.last_published_at.isoformat(),
+            translation.get_language(),
+            *self.get_content_versions(),
+        )
+        return etag, self.last_published_at
+
+    def serve(self, request, *args, **kwargs):
+        if not is_conditional_request(request):
+            return super().serve(request, *args, **kwargs)
+        etag, last_modified = self.get_validators(request, *args, **kwargs)
+        if etag is None:
+            return super().serve(request, *args, **kwargs)
+
+        timestamp = int(last_modified.timestamp())
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = super().serve(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            response["ETag"] = etag
+            response["Last-Modified"] = http_date(timestamp)
+        return response
+
+
+class ListingConditionalServeMixin(ConditionalServeMixin):
+    """
+    For pages that list other pages. The validators change whenever a listed
+    page is published or unpublished, or the listing is served with other
+    arguments (like the blog's tag and category views).
+    """
+
+    def get_listed_pages(self):
+        return self.get_descendants().live()
+
+    def get_validators(self, request, *args, **kwargs):
+        listed = self.get_listed_pages().aggregate(
+            newest=Max("last_published_at"), count=Count("pk")
+        )
+        published = [self.last_published_at, listed["newest"]]
+        if not any(published):
+            return None, None
+        last_modified = max(filter(None, published))
+        etag = make_etag(
+            self.pk,
+            self.live_revision_id,
+            last_modified.isoformat(),
+            listed["count"],
+            translation.get_language(),
+            sorted((key, str(value)) for key, value in kwargs.items()),
+            *self.get_content_versions(),
+        )
+        return etag, last_modified
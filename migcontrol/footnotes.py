@@ -0,0 +1,41 @@
+import re
+from collections import namedtuple
+from collections import OrderedDict
+
+from wagtail.core.templatetags.wagtailcore_tags import richtext
+
+
+FIND_FOOTNOTE_TAG = re.compile(r'<footnote id="(.*?)">.*?</footnote>')
+
+FOOTNOTE_LINK = '<a href="#footnote-{0}" id="footnote-source-{0}"><sup>[{0}]</sup></a>'
+
+RenderedFootnote = namedtuple("RenderedFootnote", ["index", "uuid", "html"])
+
+
+def render_footnotes(html, footnotes):
+    """
+    Replaces the <footnote id="..."> tags in already processed richtext html
+    by numbered links to the footnotes, in the order they are first
+    referenced. Tags of unknown footnotes are removed.
+
+    Returns the new html and the list of referenced footnotes as
+    RenderedFootnote, with the footnote text already expanded.
+    """
+    footnotes = {str(footnote.uuid): footnote for footnote in footnotes}
+    # uuid -> index, footnotes are indexed starting at 1 not 0.
+    numbered = OrderedDict()
+
+    def replace_tag(match):
+        footnote_id = match.group(1)
+        if footnote_id not in footnotes:
+            return ""
+        if footnote_id not in numbered:
+            numbered[footnote_id] = len(numbered) + 1
+        return FOOTNOTE_LINK.format(numbered[footnote_id])
+
+    html = FIND_FOOTNOTE_TAG.sub(replace_tag, html)
+    rendered_footnotes = [
+        RenderedFootnote(index, footnote_id, richtext(footnotes[footnote_id].text))
+        for footnote_id, index in numbered.items()
+    ]
+    return html, rendered_footnotes
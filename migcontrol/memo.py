@@ -0,0 +1,68 @@
+"""
+Memoization of template tags for the duration of a request.
+
+Tags like slugurl_localized are called with the same arguments many times
+while rendering one page. memoize_per_request() stores their results in a
+dict attached to the request, so each distinct call runs once per request.
+The key function decides what distinguishes two calls, everything that
+isn't part of the key must be the same for the whole request.
+"""
+import functools
+
+from django.utils import translation
+
+
+def get_request_memo(request):
+    """
+    Returns the memo dict of the request, creating it on first use.
+    """
+    try:
+        return request._migcontrol_memo
+    except AttributeError:
+        request._migcontrol_memo = {}
+        return request._migcontrol_memo
+
+
+def memoize_per_request(key):
+    """
+    Decorator for simple tags registered with takes_context=True.
+
+    key(context, *args, **kwargs) returns a hashable key for the call. The
+    result is stored under it in the memo of context["request"]. Without a
+    request in the context the tag is called every time.
+
+    example:
+
+        @register.simple_tag(takes_context=True)
+        @memoize_per_request(key=lambda context, parent, slug: (parent.pk, slug))
+        def get_page_by_slug(context, parent, slug):
+            ...
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(context, *args, **kwargs):
+            request = context.get("request")
+            if request is None:
+                return func(context, *args, **kwargs)
+            memo = get_request_memo(request)
+            memo_key = (
+                func.__module__,
+                func.__qualname__,
+                key(context, *args, **kwargs),
+            )
+            if memo_key not in memo:
+                memo[memo_key] = func(context, *args, **kwargs)
+            return memo[memo_key]
+
+        return wrapper
+
+    return decorator
+
+
+def language_key(context, *args, **kwargs):
+    """
+    Key for tags that depend on their arguments and the active language.
+    Arguments must be hashable, use a custom key for model instances.
+    """
+    return (translation.get_language(), args, tuple(sorted(kwargs.items())))
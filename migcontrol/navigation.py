@@ -0,0 +1,125 @@
+"""
+The navigation menus of base.html, built once per site and language.
+
+The meta menu, the main menu and the footer menu only hold titles and URLs,
+so they are cached across requests and rendering them costs no queries.
+The cached menus are removed whenever a page is published, unpublished,
+moved, renamed or deleted, and when a site is saved.
+"""
+from collections import namedtuple
+
+from django.db.models import Q
+from django.db.models.signals import post_save
+from django.utils import translation
+from wagtail.core.models import Site
+from wagtail.core.utils import get_content_languages
+from wagtail.core.utils import get_supported_content_language_variant
+
+from migcontrol.rendering import get_render_cache
+from migcontrol.rendering import site_content_changed
+
+
+META_MENU_SLUGS = ["contact", "subscribe", "donate"]
+FOOTER_MENU_SLUGS = ["imprint", "data-protection", "contact"]
+
+
+MenuItem = namedtuple("MenuItem", ["title", "url"])
+
+
+class NavigationMenu:
+    """
+    Holds the items of the menus of a site in one language. Pages of the
+    meta and footer menus that don't exist are left out.
+    """
+
+    def __init__(self, meta_menu, main_menu, footer_menu):
+        self.meta_menu = meta_menu
+        self.main_menu = main_menu
+        self.footer_menu = footer_menu
+
+    @classmethod
+    def build(cls, site):
+        site_root = site.root_page.localized
+        slugs = set(META_MENU_SLUGS + FOOTER_MENU_SLUGS)
+        children = list(
+            site_root.get_children().filter(
+                Q(slug__in=slugs) | Q(live=True, show_in_menus=True)
+            )
+        )
+        by_slug = {page.slug: page for page in children if page.slug in slugs}
+
+        def menu_items(pages):
+            return [MenuItem(page.title, page.url) for page in pages]
+
+        return cls(
+            meta_menu=menu_items(
+                by_slug[slug] for slug in META_MENU_SLUGS if slug in by_slug
+            ),
+            main_menu=menu_items(
+                page for page in children if page.live and page.show_in_menus
+            ),
+            footer_menu=menu_items(
+                by_slug[slug] for slug in FOOTER_MENU_SLUGS if slug in by_slug
+            ),
+        )
+
+
+def is_menu_page(page):
+    """
+    Whether the page can show up in the navigation menus of all pages, so
+    publishing it changes every page. The site roots and their children are
+    always counted, as the meta and footer menus are picked by slug.
+    """
+    return page.show_in_menus or page.depth <= 3
+
+
+def changes_every_page(page, tree_changed):
+    """
+    Whether a change of the page, as sent by site_content_changed, changes
+    every page: the page is part of the navigation menus, or the URLs of
+    pages changed.
+    """
+    return tree_changed or is_menu_page(page)
+
+
+def get_menu_language():
+    try:
+        return get_supported_content_language_variant(translation.get_language())
+    except LookupError:
+        return None
+
+
+def navigation_menu_cache_key(site_id, language):
+    return "migcontrol:menu:{}:{}".format(site_id, language)
+
+
+def get_navigation_menu(site):
+    """
+    Returns the NavigationMenu of the site in the active language.
+    """
+    cache = get_render_cache()
+    key = navigation_menu_cache_key(site.pk, get_menu_language())
+    menu = cache.get(key)
+    if menu is None:
+        menu = NavigationMenu.build(site)
+        cache.set(key, menu)
+    return menu
+
+
+def invalidate_navigation_menus():
+    languages = list(get_content_languages()) + [None]
+    get_render_cache().delete_many(
+        [
+            navigation_menu_cache_key(site_id, language)
+            for site_id in Site.objects.values_list("pk", flat=True)
+            for language in languages
+        ]
+    )
+
+
+def invalidate_navigation_menus_handler(sender, **kwargs):
+    invalidate_navigation_menus()
+
+
+site_content_changed.connect(invalidate_navigation_menus_handler)
+post_save.connect(invalidate_navigation_menus_handler, sender=Site)
@@ -0,0 +1,237 @@
+"""
+Full-page cache for anonymous readers.
+
+PageCacheMiddleware stores the responses to anonymous GET requests, keyed by
+host, path (which includes the language prefix) and the query parameters in
+MIGCONTROL_PAGE_CACHE_PARAMS. Requests with other query parameters, logged
+in users, previews and responses that set cookies are never cached.
+
+Every cached response belongs to a group that has a version, and the key
+contains the version. Bumping the version of a group drops all its
+responses at once, whatever their query parameters:
+
+* a Wagtail page is its own group, named by its language and path,
+* all other views, like the blog's tag, category and author listings, are
+  in the "listings" group.
+
+Publishing or unpublishing a page bumps the groups of the page, its
+ancestors and their translations, and the listings. As all pages show the
+navigation menus, publishing a menu page, moving, renaming or deleting a
+page bumps a version shared by all groups.
+
+The versions live in the "versions" cache, and both caches must be shared
+by all server processes, or a publish only invalidates the responses of the
+process that handled it. See CACHES in the settings.
+
+Hits and misses are counted in memory per process, so counting doesn't
+write to the cache on every request, see get_page_cache_stats().
+"""
+import hashlib
+import os
+import threading
+from collections import Counter
+
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.cache import caches
+from django.http import JsonResponse
+from django.urls import resolve
+from django.urls import Resolver404
+from django.utils import translation
+from django.utils.cache import get_conditional_response
+from django.utils.http import urlencode
+from wagtail.core.models import Page
+
+from migcontrol.navigation import changes_every_page
+from migcontrol.navigation import get_menu_language
+from migcontrol.rendering import bump_versions
+from migcontrol.rendering import get_version
+from migcontrol.rendering import get_versions
+from migcontrol.rendering import site_content_changed
+
+
+PAGE_CACHE_ALIAS = getattr(settings, "MIGCONTROL_PAGE_CACHE", "pages")
+
+PAGE_CACHE_TIMEOUT = getattr(settings, "MIGCONTROL_PAGE_CACHE_TIMEOUT", 60 * 10)
+
+PAGE_CACHE_PARAMS = getattr(
+    settings,
+    "MIGCONTROL_PAGE_CACHE_PARAMS",
+    ["page", "after", "before", "tag", "category"],
+)
+
+LISTINGS_GROUP = "listings"
+
+# Shared by all groups
+GLOBAL_GROUP = "*"
+
+HITS = "hits"
+MISSES = "misses"
+
+# Hits and misses of this process
+counters = Counter()
+counters_lock = threading.Lock()
+
+
+def get_page_cache():
+    return caches[PAGE_CACHE_ALIAS]
+
+
+def version_key(group):
+    return "migcontrol:page-version:{}".format(group)
+
+
+def get_group_versions(group):
+    """
+    Returns the versions of all groups and of the group.
+    """
+    return get_versions([version_key(GLOBAL_GROUP), version_key(group)])
+
+
+def get_site_version():
+    """
+    The version of all groups, bumped when the navigation menus or the URLs
+    of pages change.
+    """
+    return get_version(version_key(GLOBAL_GROUP))
+
+
+def bump_groups(groups):
+    bump_versions([version_key(group) for group in groups])
+
+
+def strip_language_prefix(path):
+    return "/" + path.lstrip("/").partition("/")[2]
+
+
+def page_group(language_code, path):
+    return "page:{}:{}".format(language_code, strip_language_prefix(path))
+
+
+def get_request_group(request):
+    """
+    Returns the group of the request, or None if it can't be cached.
+    """
+    try:
+        match = resolve(request.path_info)
+    except Resolver404:
+        return None
+    if match.url_name == "wagtail_serve":
+        return page_group(get_menu_language(), request.path)
+    return LISTINGS_GROUP
+
+
+def get_page_groups(page):
+    """
+    Returns the groups of the page, its ancestors and their translations.
+    """
+    translations = Page.objects.filter(translation_key=page.translation_key)
+    pages = {page.pk: page for page in translations}
+    for translation_page in list(pages.values()):
+        for ancestor in translation_page.get_ancestors():
+            pages[ancestor.pk] = ancestor
+
+    groups = set()
+    for group_page in pages.values():
+        language_code = group_page.locale.language_code
+        with translation.override(language_code):
+            url_parts = group_page.get_url_parts()
+        if url_parts and url_parts[2]:
+            groups.add(page_group(language_code, url_parts[2]))
+    return groups
+
+
+def is_cacheable_request(request):
+    if request.method not in ("GET", "HEAD"):
+        return False
+    if any(param not in PAGE_CACHE_PARAMS for param in request.GET):
+        return False
+    return not request.user.is_authenticated
+
+
+def is_cacheable_response(request, response):
+    if getattr(request, "is_preview", False):
+        return False
+    if response.status_code != 200 or response.streaming:
+        return False
+    if response.cookies or request.META.get("CSRF_COOKIE_USED"):
+        return False
+    return "private" not in response.get("Cache-Control", "")
+
+
+def get_cache_key(request, group, versions):
+    params = urlencode(sorted(request.GET.lists()), doseq=True)
+    url = hashlib.md5(
+        "{}{}?{}".format(request.get_host(), request.path, params).encode()
+    ).hexdigest()
+    return "migcontrol:page:{}:{}:{}:{}:{}".format(
+        request.method, versions[0], versions[1], group, url
+    )
+
+
+def count(name):
+    with counters_lock:
+        counters[name] += 1
+
+
+def get_page_cache_stats():
+    """
+    {"pid": int, "hits": int, "misses": int} of the process that answers,
+    since it started.
+    """
+    with counters_lock:
+        return {"pid": os.getpid(), HITS: counters[HITS], MISSES: counters[MISSES]}
+
+
+@staff_member_required
+def page_cache_stats_view(request):
+    return JsonResponse(get_page_cache_stats())
+
+
+class PageCacheMiddleware:
+    """
+    Must come after AuthenticationMiddleware and LocaleMiddleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not is_cacheable_request(request):
+            return self.get_response(request)
+        group = get_request_group(request)
+        if group is None:
+            return self.get_response(request)
+
+        cache = get_page_cache()
+        cache_key = get_cache_key(request, group, get_group_versions(group))
+        response = cache.get(cache_key)
+        if response is not None:
+            count(HITS)
+            # ETag set by ConditionalServeMixin, which doesn't answer
+            # If-Modified-Since alone either
+            response = (
+                get_conditional_response(
+                    request, etag=response.get("ETag"), response=response
+                )
+                or response
+            )
+            response["X-Page-Cache"] = "hit"
+            return response
+
+        count(MISSES)
+        response = self.get_response(request)
+        if is_cacheable_response(request, response):
+            cache.set(cache_key, response, PAGE_CACHE_TIMEOUT)
+        response["X-Page-Cache"] = "miss"
+        return response
+
+
+def invalidate_page_handler(sender, instance, tree_changed, **kwargs):
+    if changes_every_page(instance, tree_changed):
+        bump_groups([GLOBAL_GROUP])
+    else:
+        bump_groups(get_page_groups(instance) | {LISTINGS_GROUP})
+
+
+site_content_changed.connect(invalidate_page_handler)
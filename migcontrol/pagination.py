@@ -0,0 +1,140 @@
+"""
+Keyset pagination for listings ordered newest first.
+
+Paginator counts all rows and skips the rows of the previous pages with
+OFFSET on every request, which gets slower the deeper the page. A
+KeysetPaginator orders by a field and the primary key, both descending, and
+continues after or before the (field, pk) of the last or first row the
+reader saw. That's a range condition the database answers from an index on
+(field, pk), without counting.
+
+The position is passed around as an opaque cursor token. An invalid token
+gives the first page.
+"""
+import json
+
+from django.core import signing
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+
+AFTER = "after"
+BEFORE = "before"
+
+
+class KeysetPage:
+    """
+    The rows of one page, and the cursors of the pages before and after it,
+    which are None when there is no such page.
+    """
+
+    def __init__(self, object_list, previous_cursor, next_cursor):
+        self.object_list = object_list
+        self.previous_cursor = previous_cursor
+        self.next_cursor = next_cursor
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+
+class KeysetPaginator:
+    """
+    example:
+
+        paginator = KeysetPaginator(BlogPage.objects.live(), 12, "date")
+        page = paginator.page(request.GET.get("after"), request.GET.get("before"))
+    """
+
+    def __init__(self, queryset, per_page, field):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.field = field
+        self.model_field = queryset.model._meta.get_field(field)
+
+    def make_cursor(self, obj):
+        return signing.b64_encode(
+            json.dumps(
+                [self.model_field.value_to_string(obj), str(obj.pk)],
+                separators=(",", ":"),
+            ).encode()
+        ).decode()
+
+    def parse_cursor(self, cursor):
+        """
+        Returns (value, pk), or None if the cursor isn't valid.
+        """
+        try:
+            value, pk = json.loads(signing.b64_decode(cursor.encode()))
+            value = self.model_field.to_python(value)
+            pk = self.queryset.model._meta.pk.to_python(pk)
+        except (TypeError, ValueError, ValidationError):
+            return None
+        if value is None or pk is None:
+            # Can't be compared with
+            return None
+        return value, pk
+
+    def page(self, after=None, before=None):
+        """
+        The page after the cursor after, or before the cursor before, or the
+        first page.
+        """
+        key = self.parse_cursor(after) if after else None
+        if key is not None:
+            return self.page_after(*key)
+        key = self.parse_cursor(before) if before else None
+        if key is not None:
+            return self.page_before(*key)
+        return self.page_after(None, None)
+
+    def page_after(self, value, pk):
+        queryset = self.queryset.order_by("-" + self.field, "-pk")
+        if value is not None:
+            queryset = queryset.filter(
+                Q(**{self.field + "__lt": value})
+                | Q(**{self.field: value, "pk__lt": pk})
+            )
+        per_page = limit = self.per_page
+        limit += 1
+        rows = list(queryset[:limit])
+        object_list = rows[:per_page]
+        if value is not None and not object_list:
+            # Nothing older, for instance after those rows were unpublished
+            return self.page_after(None, None)
+        return KeysetPage(
+            object_list,
+            self.make_cursor(object_list[0]) if value is not None else None,
+            self.make_cursor(object_list[-1]) if len(rows) > per_page else None,
+        )
+
+    def page_before(self, value, pk):
+        queryset = self.queryset.order_by(self.field, "pk").filter(
+            Q(**{self.field + "__gt": value}) | Q(**{self.field: value, "pk__gt": pk})
+        )
+        per_page = limit = self.per_page
+        limit += 1
+        rows = list(queryset[:limit])
+        object_list = rows[:per_page][::-1]
+        if not object_list:
+            # Nothing newer, for instance after those rows were unpublished
+            return self.page_after(None, None)
+        return KeysetPage(
+            object_list,
+            self.make_cursor(object_list[0]) if len(rows) > per_page else None,
+            self.make_cursor(object_list[-1]),
+        )
@@ -0,0 +1,117 @@
+"""
+Public mode for anonymous requests on the content routes.
+
+SessionMiddleware adds Vary: Cookie as soon as anything looks at the user,
+and LocaleMiddleware can add Vary: Accept-Language. Both keep shared caches
+from storing our pages, although anonymous readers all get the same page
+and the language is in the URL.
+
+PublicResponseMiddleware comes first in MIDDLEWARE, so it sees the response
+after all other middleware. For anonymous GET and HEAD requests on the
+routes in MIGCONTROL_PUBLIC_VIEWS it removes Cookie and Accept-Language from
+Vary and marks the response public, with MIGCONTROL_PUBLIC_MAX_AGE for
+shared caches. Browsers still revalidate every time, using the validators
+from migcontrol.conditional.
+
+Responses to logged in users and previews, and responses that set a cookie
+or use the CSRF token, are marked private instead, as a shared cache would
+hand them to every reader. The reverse proxy must also not serve cached
+pages to requests with a session cookie, as Vary doesn't tell it anymore.
+The surrogate keys of migcontrol.surrogate are only sent with public
+responses.
+"""
+from django.conf import settings
+from django.urls import resolve
+from django.urls import Resolver404
+from django.utils.cache import cc_delim_re
+from django.utils.cache import patch_cache_control
+
+from migcontrol.surrogate import SURROGATE_HEADERS
+
+
+PUBLIC_VIEWS = getattr(
+    settings,
+    "MIGCONTROL_PUBLIC_VIEWS",
+    [
+        "wagtail_serve",
+        "search",
+        "blog:tag",
+        "blog:category",
+        "blog:category_feed",
+        "blog:locale",
+        "blog:author",
+        "blog:latest_entries_feed",
+        "blog:latest_entries_feed_atom",
+    ],
+)
+
+PUBLIC_MAX_AGE = getattr(settings, "MIGCONTROL_PUBLIC_MAX_AGE", 60 * 10)
+
+# The language is in the URL, and anonymous readers all get the same page
+PRIVATE_VARY_HEADERS = {"cookie", "accept-language"}
+
+
+def is_public_view(request):
+    try:
+        return resolve(request.path_info).view_name in PUBLIC_VIEWS
+    except Resolver404:
+        return False
+
+
+def is_anonymous_request(request):
+    if getattr(request, "is_preview", False):
+        return False
+    user = getattr(request, "user", None)
+    return user is None or not user.is_authenticated
+
+
+def is_public_response(request, response):
+    if response.status_code not in (200, 304):
+        return False
+    if response.cookies or request.META.get("CSRF_COOKIE_USED"):
+        return False
+    return "private" not in response.get("Cache-Control", "")
+
+
+def remove_private_vary_headers(response):
+    if not response.has_header("Vary"):
+        return
+    vary = [
+        header
+        for header in cc_delim_re.split(response["Vary"])
+        if header.lower() not in PRIVATE_VARY_HEADERS
+    ]
+    if vary:
+        response["Vary"] = ", ".join(vary)
+    else:
+        del response["Vary"]
+
+
+def remove_surrogate_headers(response):
+    for header in SURROGATE_HEADERS:
+        if response.has_header(header):
+            del response[header]
+
+
+class PublicResponseMiddleware:
+    """
+    Must come first in MIDDLEWARE.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if request.method not in ("GET", "HEAD") or not is_public_view(request):
+            remove_surrogate_headers(response)
+            return response
+        if is_anonymous_request(request) and is_public_response(request, response):
+            remove_private_vary_headers(response)
+            patch_cache_control(
+                response, public=True, max_age=0, s_maxage=PUBLIC_MAX_AGE
+            )
+        else:
+            patch_cache_control(response, private=True)
+            remove_surrogate_headers(response)
+        return response
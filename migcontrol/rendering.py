@@ -0,0 +1,263 @@
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models.signals import post_delete
+from django.dispatch import Signal
+from django.utils import translation
+from django.utils.functional import cached_property
+from django.utils.safestring import mark_safe
+from wagtail.core.models import Page
+from wagtail.core.signals import page_published
+from wagtail.core.signals import page_slug_changed
+from wagtail.core.signals import page_unpublished
+from wagtail.core.signals import post_page_move
+
+from migcontrol.headings import anchor_headings
+from migcontrol.headings import Heading
+from migcontrol.stale import get_or_refresh
+from migcontrol.utils import toc
+
+
+RENDER_CACHE_ALIAS = getattr(settings, "MIGCONTROL_RENDER_CACHE", "renders")
+
+# Holds the version keys of all caches. It must not cull them along with the
+# entries, see CACHES in the settings.
+VERSION_CACHE_ALIAS = getattr(settings, "MIGCONTROL_VERSION_CACHE", "versions")
+
+# Names of all the renders that are cached per page. Invalidating a page
+# removes every one of them.
+RENDER_CACHE_NAMES = ["body", "footnotes", "toc"]
+
+# Sent when a page is published, unpublished, moved, renamed or deleted, with
+# the page as instance. tree_changed is True for moves, renames and
+# deletions, which change the URLs of the page and its descendants.
+site_content_changed = Signal()
+
+# Bumped when the URLs of pages change, which the links in rendered bodies
+# point to
+TREE_VERSION_KEY = "migcontrol:tree-version"
+
+
+def get_render_cache():
+    return caches[RENDER_CACHE_ALIAS]
+
+
+def get_version_cache():
+    return caches[VERSION_CACHE_ALIAS]
+
+
+def get_versions(keys):
+    """
+    Returns the versions stored under the keys, creating missing ones. A
+    version that was dropped from the cache is replaced by a new one, which
+    only causes misses.
+    """
+    cache = get_version_cache()
+    versions = cache.get_many(keys)
+    missing = {key: uuid.uuid4().hex for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, None)
+        versions.update(missing)
+    return [versions[key] for key in keys]
+
+
+def get_version(key):
+    return get_versions([key])[0]
+
+
+def bump_versions(keys):
+    get_version_cache().delete_many(keys)
+
+
+def bump_version(key):
+    bump_versions([key])
+
+
+def get_tree_version():
+    return get_version(TREE_VERSION_KEY)
+
+
+def render_cache_key(page, name):
+    return "migcontrol:render:{}:{}:{}".format(name, page.pk, page.locale_id)
+
+
+def render_cache_marker(page):
+    """
+    Identifies the published revision of a page. Returns None when the page
+    shouldn't be cached at all (not live, or a preview of unsaved changes).
+    """
+    if getattr(page, "is_preview", False):
+        return None
+    if not page.live or not page.live_revision_id or not page.last_published_at:
+        return None
+    return "{}:{}".format(page.live_revision_id, page.last_published_at.isoformat())
+
+
+def cached_render(page, name, render, variant=""):
+    """
+    Returns render() for the page, cached until a new revision of the page is
+    published or it's unpublished. Renders that depend on more than the page
+    itself pass a variant that identifies their other input. When it isn't
+    cached, only one worker renders it and the others wait for the result.
+    """
+    marker = render_cache_marker(page)
+    if marker is None:
+        return render()
+
+    return get_or_refresh(
+        get_render_cache(),
+        render_cache_key(page, name),
+        render,
+        version=(marker, variant),
+    )
+
+
+def invalidate_render_cache(page):
+    get_render_cache().delete_many(
+        [render_cache_key(page, name) for name in RENDER_CACHE_NAMES]
+    )
+
+
+def invalidate_render_cache_handler(sender, instance, **kwargs):
+    invalidate_render_cache(instance)
+
+
+def page_changed_handler(sender, instance, **kwargs):
+    site_content_changed.send(sender=sender, instance=instance, tree_changed=False)
+
+
+def tree_changed_handler(sender, instance, **kwargs):
+    site_content_changed.send(sender=sender, instance=instance, tree_changed=True)
+
+
+def bump_tree_version_handler(sender, tree_changed, **kwargs):
+    if tree_changed:
+        bump_version(TREE_VERSION_KEY)
+
+
+page_published.connect(invalidate_render_cache_handler)
+page_unpublished.connect(invalidate_render_cache_handler)
+page_published.connect(page_changed_handler)
+page_unpublished.connect(page_changed_handler)
+post_page_move.connect(tree_changed_handler)
+page_slug_changed.connect(tree_changed_handler)
+post_delete.connect(tree_changed_handler, sender=Page)
+site_content_changed.connect(bump_tree_version_handler)
+
+
+class RenderedBody:
+    """
+    The body of a page with id=... attributes added to all h{1,2,3,4,5}.
+
+    The HTML is parsed exactly once, the anchored HTML, the headings and the
+    TOC are all derived from that single parse. See migcontrol.headings for
+    the engines that do the parsing.
+    """
+
+    def __init__(self, html, headings):
+        self.html = mark_safe(html)
+        self.headings = headings
+
+    @classmethod
+    def from_html(cls, body, engine=None):
+        return cls(*anchor_headings(body, engine=engine))
+
+    @cached_property
+    def toc(self):
+        """
+        [(name, [*children])]
+        """
+        return toc(self.headings)
+
+    @classmethod
+    def from_stored(cls, html, headings):
+        return cls(html, [Heading(*heading) for heading in headings])
+
+    def __str__(self):
+        return self.html
+
+
+class RenderedBodyMixin:
+    """
+    Mixin for Page models with a body that has anchored headings and a TOC.
+    Subclasses implement expand_body() to return the body as HTML, and have
+    rendered_html, toc_json and rendered_tree_version fields where the
+    rendered body is stored when the page is published.
+
+    The stored body links to other pages, so it's only used while the tree
+    version it was rendered with is current. After a page is moved, renamed
+    or deleted the body is rendered again and cached, until the page is
+    published or store_rendered_bodies stores it again. The stored fields
+    aren't part of revisions.
+
+    Previews are rendered from unsaved data, so they always bypass the stored
+    body and the cache.
+    """
+
+    stored_body_fields = ["rendered_html", "toc_json", "rendered_tree_version"]
+
+    def expand_body(self):
+        raise NotImplementedError
+
+    def render_body(self):
+        """
+        Renders the current body, bypassing all caches.
+        """
+        return RenderedBody.from_html(self.expand_body())
+
+    def store_rendered_body(self):
+        """
+        Renders the body and stores it, without creating a new revision. Links
+        point to the translations in the page's language, whatever language
+        the editor or the command that publishes it uses.
+        """
+        # Read first, a change while rendering leaves the body outdated
+        self.rendered_tree_version = get_tree_version()
+        with translation.override(self.locale.language_code):
+            rendered = self.render_body()
+        self.rendered_html = rendered.html
+        self.toc_json = [list(heading) for heading in rendered.headings]
+        type(self)._default_manager.filter(pk=self.pk).update(
+            **{name: getattr(self, name) for name in self.stored_body_fields}
+        )
+        self.rendered_body = rendered
+
+    @cached_property
+    def rendered_body(self):
+        if getattr(self, "is_preview", False):
+            return self.render_body()
+        tree_version = get_tree_version()
+        if self.toc_json is not None and self.rendered_tree_version == tree_version:
+            return RenderedBody.from_stored(self.rendered_html, self.toc_json)
+        # Not stored yet, for instance pages imported before it was added, or
+        # the links of the stored body are outdated
+        return cached_render(self, "body", self.render_body, variant=tree_version)
+
+    def serializable_data(self):
+        # Revisions are rendered from their own body
+        data = super().serializable_data()
+        for name in self.stored_body_fields:
+            data.pop(name, None)
+        return data
+
+    def get_body(self):
+        return self.rendered_body.html
+
+    def get_toc(self):
+        """
+        [(name, [*children])]
+        """
+        return self.rendered_body.toc
+
+    def serve_preview(self, request, mode_name):
+        self.is_preview = True
+        return super().serve_preview(request, mode_name)
+
+
+def store_rendered_body_handler(sender, instance, **kwargs):
+    if isinstance(instance, RenderedBodyMixin):
+        instance.store_rendered_body()
+
+
+page_published.connect(store_rendered_body_handler)
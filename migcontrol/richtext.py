@@ -0,0 +1,168 @@
+"""
+Rich text expansion that resolves the references of a whole body at once.
+
+Wagtail's expand_db_html() resolves every <a linktype="page" id="...">,
+<a linktype="document" id="..."> and <embed embedtype="image" id="..."/>
+with its own queries, which adds up for imported bodies with hundreds of
+wiki links. Here all ids are collected first and loaded with one query per
+type, then the body is rewritten from those. The existing renditions of the
+embedded images are loaded in one query too.
+"""
+from collections import defaultdict
+
+from django.template.loader import render_to_string
+from django.utils.html import escape
+from wagtail.core.models import Locale
+from wagtail.core.models import Page
+from wagtail.core.rich_text import features
+from wagtail.core.rich_text import RichText
+from wagtail.core.rich_text.rewriters import EmbedRewriter
+from wagtail.core.rich_text.rewriters import extract_attrs
+from wagtail.core.rich_text.rewriters import FIND_A_TAG
+from wagtail.core.rich_text.rewriters import FIND_EMBED_TAG
+from wagtail.core.rich_text.rewriters import LinkRewriter
+from wagtail.core.rich_text.rewriters import MultiRuleRewriter
+from wagtail.documents import get_document_model
+from wagtail.images import get_image_model
+from wagtail.images.formats import get_image_format
+
+from images.image_formats import prefetch_renditions
+
+
+def collect_ids(html, pattern, type_attr):
+    """
+    Returns {type: {id, ...}} of all tags found by pattern
+    """
+    ids = defaultdict(set)
+    for attr_string in pattern.findall(html):
+        attrs = extract_attrs(attr_string)
+        if attrs.get(type_attr) and attrs.get("id", "").isdigit():
+            ids[attrs[type_attr]].add(int(attrs["id"]))
+    return ids
+
+
+def get_localized_pages(page_ids):
+    """
+    Returns {id: page} where page is what page.localized.specific would be,
+    with one query for the pages and one for their translations (plus one
+    per specific page type).
+    """
+    pages = {page.id: page for page in Page.objects.filter(id__in=page_ids).specific()}
+    try:
+        locale = Locale.get_active()
+    except (LookupError, Locale.DoesNotExist):
+        return pages
+
+    translation_keys = [
+        page.translation_key for page in pages.values() if page.locale_id != locale.id
+    ]
+    if not translation_keys:
+        return pages
+
+    translations = {
+        page.translation_key: page
+        for page in Page.objects.live()
+        .filter(translation_key__in=translation_keys, locale=locale)
+        .specific()
+    }
+    return {
+        page_id: translations.get(page.translation_key, page)
+        for page_id, page in pages.items()
+    }
+
+
+class BatchedExpander:
+    """
+    Wraps the registered link and embed handlers so the model instances they
+    need come from bulk loaded dicts.
+    """
+
+    def __init__(self, html):
+        link_ids = collect_ids(html, FIND_A_TAG, "linktype")
+        image_embeds = [
+            attrs
+            for attrs in map(extract_attrs, FIND_EMBED_TAG.findall(html))
+            if attrs.get("embedtype") == "image" and attrs.get("id", "").isdigit()
+        ]
+
+        self.pages = get_localized_pages(link_ids["page"]) if link_ids["page"] else {}
+        self.documents = (
+            get_document_model().objects.in_bulk(link_ids["document"])
+            if link_ids["document"]
+            else {}
+        )
+        self.images = (
+            get_image_model().objects.in_bulk(
+                {int(attrs["id"]) for attrs in image_embeds}
+            )
+            if image_embeds
+            else {}
+        )
+        filter_specs = set()
+        for attrs in image_embeds:
+            try:
+                filter_specs.add(get_image_format(attrs["format"]).filter_spec)
+            except KeyError:
+                pass
+        prefetch_renditions(list(self.images.values()), filter_specs)
+
+    def get_instance(self, instances, attrs):
+        try:
+            return instances.get(int(attrs["id"]))
+        except (KeyError, ValueError):
+            return None
+
+    def expand_page_link(self, attrs):
+        page = self.get_instance(self.pages, attrs)
+        if page is None:
+            return "<a>"
+        return '<a href="%s">' % escape(page.url)
+
+    def expand_document_link(self, attrs):
+        document = self.get_instance(self.documents, attrs)
+        if document is None:
+            return "<a>"
+        return '<a href="%s">' % escape(document.url)
+
+    def expand_image_embed(self, attrs):
+        image = self.get_instance(self.images, attrs)
+        if image is None:
+            return '<img alt="">'
+        image_format = get_image_format(attrs["format"])
+        return image_format.image_to_html(image, attrs.get("alt", ""))
+
+    def get_rewriter(self):
+        link_rules = {
+            linktype: handler.expand_db_attributes
+            for linktype, handler in features.get_link_types().items()
+        }
+        link_rules["page"] = self.expand_page_link
+        link_rules["document"] = self.expand_document_link
+        embed_rules = {
+            embedtype: handler.expand_db_attributes
+            for embedtype, handler in features.get_embed_types().items()
+        }
+        embed_rules["image"] = self.expand_image_embed
+        return MultiRuleRewriter([LinkRewriter(link_rules), EmbedRewriter(embed_rules)])
+
+
+def expand_db_html(html):
+    """
+    Expand database-representation HTML into proper HTML usable on front-end
+    templates, like wagtail.core.rich_text.expand_db_html.
+    """
+    return BatchedExpander(html).get_rewriter()(html)
+
+
+def richtext(value, rewriter=None):
+    """
+    Same as Wagtail's |richtext filter, using the batched expand_db_html.
+    A rewriter from BatchedExpander.get_rewriter() can be passed when the
+    references of the value were already loaded with others.
+    """
+    if isinstance(value, RichText):
+        value = value.source
+    elif value is None:
+        value = ""
+    html = expand_db_html(value) if rewriter is None else rewriter(value)
+    return render_to_string("wagtailcore/shared/richtext.html", {"html": html})
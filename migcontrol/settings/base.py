@@ -63,6 +63,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "migcontrol.public.PublicResponseMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -72,6 +73,8 @@ MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
     "django.middleware.locale.LocaleMiddleware",
     "wagtail.contrib.redirects.middleware.RedirectMiddleware",
+    "migcontrol.pagecache.PageCacheMiddleware",
+    "migcontrol.surrogate.SurrogateKeyMiddleware",
 ]
 
 ROOT_URLCONF = "migcontrol.urls"
@@ -108,6 +111,81 @@ DATABASES = {
     }
 }
 
+# Cache
+# https://docs.djangoproject.com/en/3.2/topics/cache/
+#
+# The "renders" cache holds the rendered bodies of blog and wiki pages and
+# the navigation menus. Entries are tied to the published revision and are
+# invalidated when a page is (un)published, so they can live for a long time.
+# The "pages" cache holds the full-page cache. MAX_ENTRIES bounds their size.
+#
+# The "versions" cache holds the version keys of both, which are part of the
+# keys of their entries. It's separate so culling the entries never drops
+# the versions, which would invalidate everything at once. Its MAX_ENTRIES
+# is far above the number of versions (a few per page), so it's never culled
+# itself.
+#
+# All must be shared by all server processes: publishing a page bumps the
+# versions in the process that handles the admin request, and a per-process
+# cache like LocMemCache would leave the other workers serving the old
+# content until their entries expire. The refresh lock of migcontrol.stale,
+# which keeps the workers from all rendering the same missing or stale entry
+# at once, is a cache.add() in them, and only works across processes with a
+# shared backend too. They are database caches, created by
+# "manage.py createcachetable". Memcached or Redis can replace them in
+# local.py.
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "renders": {
+        "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+        "LOCATION": "migcontrol_renders",
+        "TIMEOUT": 60 * 60 * 24,
+        "OPTIONS": {
+            "MAX_ENTRIES": 2000,
+        },
+    },
+    "pages": {
+        "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+        "LOCATION": "migcontrol_pages",
+        "TIMEOUT": 60 * 10,
+        "OPTIONS": {
+            "MAX_ENTRIES": 5000,
+        },
+    },
+    "versions": {
+        "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+        "LOCATION": "migcontrol_versions",
+        "TIMEOUT": None,
+        "OPTIONS": {
+            "MAX_ENTRIES": 1000000,
+        },
+    },
+}
+
+MIGCONTROL_RENDER_CACHE = "renders"
+MIGCONTROL_VERSION_CACHE = "versions"
+
+# Full-page cache for anonymous readers, see migcontrol/pagecache.py
+MIGCONTROL_PAGE_CACHE = "pages"
+MIGCONTROL_PAGE_CACHE_TIMEOUT = 60 * 10
+MIGCONTROL_PAGE_CACHE_PARAMS = ["page", "after", "before", "tag", "category"]
+
+# Anonymous responses on content routes are public, without Vary: Cookie,
+# see migcontrol/public.py. This is how long shared caches may keep them.
+MIGCONTROL_PUBLIC_MAX_AGE = 60 * 10
+
+# Endpoint that purges surrogate keys from the proxy or CDN in front of the
+# site, see migcontrol/surrogate.py. Nothing is purged when it's None.
+MIGCONTROL_PURGE_URL = None
+MIGCONTROL_PURGE_HEADERS = {}
+
+# Engine that adds anchors to the headings of blog and wiki page bodies, either
+# "html5lib" or the faster "tokenizer". See migcontrol/headings.py
+MIGCONTROL_HEADING_ENGINE = "html5lib"
+
 LOCALE_PATHS = [os.path.join(BASE_DIR, "locale")]
 
 LOGGING = {
@@ -235,6 +313,13 @@ MEDIA_URL = "/media/"
 
 THUMBNAIL_DEBUG = True
 
+# Thumbnails of static files used by the templates through the
+# get_static_thumbnail tag, as (path, geometry, options). They are generated
+# into STATIC_ROOT by the generate_static_thumbnails command.
+MIGCONTROL_STATIC_THUMBNAILS = [
+    ("images/logo.png", "300x100", {"format": "PNG"}),
+]
+
 SITE_ID = 1
 
 
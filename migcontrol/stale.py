@@ -0,0 +1,130 @@
+"""
+Stale-while-revalidate for expensive cached computations.
+
+When a popular entry expires, every worker that misses it would compute it at
+the same time. get_or_refresh() lets only one of them do it:
+
+* an entry is fresh for soft_ttl seconds. After that it's stale, and the
+  first worker to take the refresh lock recomputes it while the others keep
+  returning the stale value,
+* the cache drops the entry after hard_ttl seconds. On a miss, the worker
+  holding the lock computes the value and the others wait for it. When the
+  lock is released without a value, because computing it failed, the next
+  worker to take the lock computes it. After
+  MIGCONTROL_REFRESH_LOCK_TIMEOUT seconds the others stop waiting and
+  compute it themselves.
+
+An entry with another version than the requested one is never returned,
+it's treated like a miss. Use it for values keyed by a published revision,
+which must not be served once a newer one is published.
+
+The lock is a cache.add(), which is atomic in the shared cache backends
+(memcached, Redis, database). With LocMemCache it only covers the threads of
+one process, so the caches it's used with must be shared by all server
+processes, see CACHES in the settings.
+"""
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+
+
+# Longest time a worker holds the refresh lock, and waits for another worker
+# to fill a missing entry
+REFRESH_LOCK_TIMEOUT = getattr(settings, "MIGCONTROL_REFRESH_LOCK_TIMEOUT", 10)
+
+WAIT_INTERVAL = 0.05
+
+
+def refresh_lock_key(key):
+    return "{}:refresh-lock".format(key)
+
+
+def acquire_refresh_lock(cache, key):
+    """
+    Returns a token if the lock was taken, None if another worker holds it.
+    """
+    token = uuid.uuid4().hex
+    if cache.add(refresh_lock_key(key), token, REFRESH_LOCK_TIMEOUT):
+        return token
+    return None
+
+
+def release_refresh_lock(cache, key, token):
+    # Don't release a lock that expired and was taken by another worker
+    if cache.get(refresh_lock_key(key)) == token:
+        cache.delete(refresh_lock_key(key))
+
+
+def parse_entry(entry, version):
+    """
+    Returns (value, refresh_at) of a cached entry, or None on a miss.
+    """
+    if entry is None or entry[0] != version:
+        return None
+    return entry[2], entry[1]
+
+
+def get_entry(cache, key, version):
+    return parse_entry(cache.get(key), version)
+
+
+def refresh(cache, key, compute, soft_ttl, hard_ttl, version):
+    value = compute()
+    refresh_at = None if soft_ttl is None else time.time() + soft_ttl
+    cache.set(key, (version, refresh_at, value), hard_ttl)
+    return value
+
+
+def wait_for_entry(cache, key, version):
+    """
+    Waits for the worker holding the refresh lock to fill the entry. Returns
+    (entry, None) once it's there, and (None, token) when the lock was
+    released without it, for instance because computing it failed, and this
+    worker took the lock to compute it. Returns (None, None) on timeout.
+    """
+    lock_key = refresh_lock_key(key)
+    deadline = time.monotonic() + REFRESH_LOCK_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(WAIT_INTERVAL)
+        cached = cache.get_many([key, lock_key])
+        entry = parse_entry(cached.get(key), version)
+        if entry is not None:
+            return entry, None
+        if lock_key not in cached:
+            token = acquire_refresh_lock(cache, key)
+            if token is not None:
+                return None, token
+    return None, None
+
+
+def get_or_refresh(
+    cache, key, compute, soft_ttl=None, hard_ttl=DEFAULT_TIMEOUT, version=None
+):
+    """
+    Returns compute() cached under key, see the module docstring. With
+    soft_ttl=None entries never become stale, they are only refreshed when
+    they're missing or have another version.
+    """
+    entry = get_entry(cache, key, version)
+    if entry is not None:
+        value, refresh_at = entry
+        if refresh_at is None or time.time() < refresh_at:
+            return value
+        token = acquire_refresh_lock(cache, key)
+        if token is None:
+            # Another worker is refreshing it
+            return value
+    else:
+        token = acquire_refresh_lock(cache, key)
+        if token is None:
+            entry, token = wait_for_entry(cache, key, version)
+            if entry is not None:
+                return entry[0]
+
+    try:
+        return refresh(cache, key, compute, soft_ttl, hard_ttl, version)
+    finally:
+        if token is not None:
+            release_refresh_lock(cache, key, token)
@@ -0,0 +1,318 @@
+"""
+Serving the collected static files without Django.
+
+After collectstatic, the compress_static_files command writes .gz and, when
+the brotli package is installed, .br variants of the hashed files in
+STATIC_ROOT: those of ManifestStaticFilesStorage, django-compressor's output
+and the static thumbnails. It must run last, after "manage.py compress" and
+generate_static_thumbnails, or their files get no variants.
+
+StaticFilesApplication wraps the WSGI application in migcontrol/wsgi.py and
+answers GET and HEAD requests for files in STATIC_ROOT itself, so they never
+take up a Django worker. It sends the .br or else the .gz variant to clients
+that accept them, sends hashed files with a year long immutable
+Cache-Control, and answers conditional requests with 304 and single byte
+ranges with 206. Requests for anything else go to Django.
+"""
+import gzip
+import mimetypes
+import os
+import posixpath
+import re
+from collections import namedtuple
+from email.utils import formatdate
+from email.utils import parsedate_to_datetime
+
+from django.conf import settings
+
+try:
+    import brotli
+except ImportError:  # Optional, only .gz files are written without it
+    brotli = None
+
+
+# Names like main.5f3c0a0d1e2b.css, as written by ManifestStaticFilesStorage,
+# django-compressor and generate_static_thumbnails
+HASHED_NAME = re.compile(r"\.[0-9a-f]{12}\.[^./]+$")
+
+COMPRESSIBLE_EXTENSIONS = {
+    ".css",
+    ".eot",
+    ".html",
+    ".ico",
+    ".js",
+    ".json",
+    ".map",
+    ".otf",
+    ".svg",
+    ".ttf",
+    ".txt",
+    ".xml",
+}
+
+# A variant must save at least this much to be kept
+MIN_COMPRESSION_RATIO = 0.95
+
+# Preferred first
+ENCODINGS = [("br", ".br"), ("gzip", ".gz")]
+
+# Compressed files requested directly, like the variants, are sent as what
+# they are, without a Content-Encoding
+ENCODED_CONTENT_TYPES = {"br": "application/x-brotli", "gzip": "application/gzip"}
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+STATIC_MAX_AGE = getattr(settings, "MIGCONTROL_STATIC_MAX_AGE", 60)
+
+BLOCK_SIZE = 64 * 1024
+
+
+def is_hashed_name(path):
+    return bool(HASHED_NAME.search(path))
+
+
+def write_compressed(path, suffix, compress):
+    """
+    Writes compress(data) to path + suffix, unless it doesn't save enough.
+    Returns whether it was written.
+    """
+    with open(path, "rb") as source:
+        data = source.read()
+    compressed = compress(data)
+    if len(compressed) > len(data) * MIN_COMPRESSION_RATIO:
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+        return False
+    with open(path + suffix, "wb") as target:
+        target.write(compressed)
+    return True
+
+
+def compress_static_files(root):
+    """
+    Writes the compressed variants of the hashed files under root. Yields
+    (path, [suffix, ...]) for every file that was compressed.
+    """
+    compressors = [(".gz", lambda data: gzip.compress(data, 9, mtime=0))]
+    if brotli is not None:
+        compressors.append((".br", lambda data: brotli.compress(data)))
+
+    for directory, _, files in os.walk(root):
+        for name in sorted(files):
+            extension = os.path.splitext(name)[1]
+            if extension not in COMPRESSIBLE_EXTENSIONS or not is_hashed_name(name):
+                continue
+            path = os.path.join(directory, name)
+            written = [
+                suffix
+                for suffix, compress in compressors
+                if write_compressed(path, suffix, compress)
+            ]
+            if written:
+                yield path, written
+
+
+StaticFile = namedtuple(
+    "StaticFile", ["path", "content_type", "cache_control", "variants"]
+)
+
+# A representation of a StaticFile, encoding is None for the original file
+Variant = namedtuple("Variant", ["encoding", "path", "size", "etag", "last_modified"])
+
+
+def make_variant(encoding, path):
+    stat = os.stat(path)
+    etag = '"{:x}-{:x}{}"'.format(
+        int(stat.st_mtime), stat.st_size, "-" + encoding if encoding else ""
+    )
+    return Variant(encoding, path, stat.st_size, etag, int(stat.st_mtime))
+
+
+def guess_content_type(path):
+    for encoding, suffix in ENCODINGS:
+        if path.endswith(suffix):
+            return ENCODED_CONTENT_TYPES[encoding]
+    content_type, encoding = mimetypes.guess_type(path)
+    if encoding is not None:
+        return ENCODED_CONTENT_TYPES.get(encoding, "application/octet-stream")
+    content_type = content_type or "application/octet-stream"
+    if content_type.startswith("text/") or content_type == "application/javascript":
+        content_type += "; charset=utf-8"
+    return content_type
+
+
+def load_static_file(path):
+    content_type = guess_content_type(path)
+    variants = [make_variant(None, path)]
+    for encoding, suffix in ENCODINGS:
+        if os.path.isfile(path + suffix):
+            variants.append(make_variant(encoding, path + suffix))
+
+    if is_hashed_name(path):
+        cache_control = IMMUTABLE_CACHE_CONTROL
+    else:
+        cache_control = "public, max-age={}".format(STATIC_MAX_AGE)
+    return StaticFile(path, content_type, cache_control, variants)
+
+
+def parse_accept_encoding(header):
+    """
+    The set of content codings the client accepts.
+    """
+    accepted = set()
+    for item in header.split(","):
+        coding, _, params = item.strip().partition(";")
+        quality = params.strip()
+        if quality.startswith("q="):
+            try:
+                if float(quality[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(coding.strip().lower())
+    return accepted
+
+
+def parse_range(header, size):
+    """
+    Returns (start, end) of a single "bytes=" range, inclusive, or None when
+    the header can't be parsed or asks for several ranges. Raises ValueError
+    when the range can't be satisfied.
+    """
+    unit, _, ranges = header.partition("=")
+    if unit.strip() != "bytes" or "," in ranges:
+        return None
+    start, _, end = ranges.strip().partition("-")
+    try:
+        if not start:
+            # The last "end" bytes
+            length = int(end)
+            if length <= 0:
+                raise ValueError(header)
+            return max(size - length, 0), size - 1
+        start = int(start)
+        end = int(end) if end else size - 1
+    except ValueError:
+        return None
+    if start >= size or end < start:
+        raise ValueError(header)
+    return start, min(end, size - 1)
+
+
+def is_not_modified(environ, variant):
+    if_none_match = environ.get("HTTP_IF_NONE_MATCH")
+    if if_none_match is not None:
+        return if_none_match.strip() == "*" or variant.etag in if_none_match
+    if_modified_since = environ.get("HTTP_IF_MODIFIED_SINCE")
+    if if_modified_since:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        return variant.last_modified <= since
+    return False
+
+
+def read_file(path, start, length):
+    with open(path, "rb") as file_:
+        file_.seek(start)
+        while length > 0:
+            block = file_.read(min(BLOCK_SIZE, length))
+            if not block:
+                return
+            length -= len(block)
+            yield block
+
+
+class StaticFilesApplication:
+    """
+    WSGI middleware, see the module docstring. Files are looked up on first
+    request and remembered, STATIC_ROOT is expected not to change while the
+    server runs, except for new files.
+    """
+
+    def __init__(self, application, root=None, prefix=None):
+        self.application = application
+        self.root = os.path.realpath(root or settings.STATIC_ROOT)
+        self.prefix = prefix or settings.STATIC_URL
+        self.files = {}
+
+    def __call__(self, environ, start_response):
+        path = environ.get("PATH_INFO", "")
+        method = environ["REQUEST_METHOD"]
+        if not path.startswith(self.prefix) or method not in ("GET", "HEAD"):
+            return self.application(environ, start_response)
+        prefix_length = len(self.prefix)
+        static_file = self.find_file(path[prefix_length:])
+        if static_file is None:
+            return self.application(environ, start_response)
+        return self.serve(static_file, environ, start_response)
+
+    def find_file(self, name):
+        normalized = posixpath.normpath(name)
+        if normalized.startswith((".", "/")) or name.endswith("/"):
+            return None
+        # Keyed by the normalized name of existing files only, so requests
+        # for other names can't grow it
+        static_file = self.files.get(normalized)
+        if static_file is not None:
+            return static_file
+        path = os.path.realpath(os.path.join(self.root, normalized))
+        if not path.startswith(self.root + os.sep) or not os.path.isfile(path):
+            return None
+        static_file = self.files[normalized] = load_static_file(path)
+        return static_file
+
+    def select_variant(self, static_file, environ):
+        if "HTTP_RANGE" in environ or len(static_file.variants) == 1:
+            # Ranges are served from the original file
+            return static_file.variants[0]
+        accepted = parse_accept_encoding(environ.get("HTTP_ACCEPT_ENCODING", ""))
+        for variant in static_file.variants[1:]:
+            if variant.encoding in accepted:
+                return variant
+        return static_file.variants[0]
+
+    def serve(self, static_file, environ, start_response):
+        variant = self.select_variant(static_file, environ)
+        headers = [
+            ("Content-Type", static_file.content_type),
+            ("Cache-Control", static_file.cache_control),
+            ("ETag", variant.etag),
+            ("Last-Modified", formatdate(variant.last_modified, usegmt=True)),
+            ("Accept-Ranges", "bytes"),
+        ]
+        if len(static_file.variants) > 1:
+            headers.append(("Vary", "Accept-Encoding"))
+        if variant.encoding:
+            headers.append(("Content-Encoding", variant.encoding))
+
+        if is_not_modified(environ, variant):
+            start_response("304 Not Modified", headers)
+            return []
+
+        status, start, length = "200 OK", 0, variant.size
+        if "HTTP_RANGE" in environ and environ.get("HTTP_IF_RANGE", variant.etag) == (
+            variant.etag
+        ):
+            try:
+                byte_range = parse_range(environ["HTTP_RANGE"], variant.size)
+            except ValueError:
+                headers.append(("Content-Range", "bytes */{}".format(variant.size)))
+                headers.append(("Content-Length", "0"))
+                start_response("416 Range Not Satisfiable", headers)
+                return []
+            if byte_range is not None:
+                start, end = byte_range
+                status, length = "206 Partial Content", end - start + 1
+                headers.append(
+                    ("Content-Range", "bytes {}-{}/{}".format(start, end, variant.size))
+                )
+
+        headers.append(("Content-Length", str(length)))
+        start_response(status, headers)
+        if environ["REQUEST_METHOD"] == "HEAD":
+            return []
+        if status == "200 OK" and "wsgi.file_wrapper" in environ:
+            return environ["wsgi.file_wrapper"](open(variant.path, "rb"), BLOCK_SIZE)
+        return read_file(variant.path, start, length)
@@ -0,0 +1,103 @@
+"""
+StreamField rendering that loads what the blocks reference up front.
+
+Converting a StreamValue already loads the values of chooser blocks with one
+query per block type. On top of that, the renditions of all ImageChooserBlock
+images are loaded with one query, and the rich text blocks are expanded with
+a single BatchedExpander for the whole stream, so the pages, documents,
+images and renditions they reference are loaded once instead of per block.
+
+Rendered blocks are cached by the published revision of the page and their
+block id. A stream that is fully cached renders without database queries.
+"""
+from django.utils.html import conditional_escape
+from wagtail.core.blocks import RichTextBlock
+from wagtail.images.blocks import ImageChooserBlock
+
+from images.image_formats import get_prefetched_rendition
+from images.image_formats import prefetch_renditions
+from migcontrol.rendering import get_render_cache
+from migcontrol.rendering import render_cache_marker
+from migcontrol.richtext import BatchedExpander
+from migcontrol.richtext import richtext
+
+
+# The rendition ImageChooserBlock.render_basic() uses
+IMAGE_BLOCK_FILTER_SPEC = "original"
+
+
+def block_cache_key(page, marker, block_id):
+    return "migcontrol:render:block:{}:{}:{}".format(page.pk, marker, block_id)
+
+
+def render_blocks(stream_value, indexes, context=None):
+    """
+    Returns {index: html} for the blocks of stream_value at the given
+    indexes.
+
+    Rich text blocks are rendered from their source like the |richtext
+    filter, footnote tags are kept for richtext_footnotes. Other blocks are
+    rendered like {% include_block %} does.
+    """
+    children = {index: stream_value[index] for index in indexes}
+    sources = [
+        child.value.source
+        for child in children.values()
+        if isinstance(child.block, RichTextBlock)
+    ]
+    rewriter = BatchedExpander("".join(sources)).get_rewriter() if sources else None
+
+    images = [
+        child.value
+        for child in children.values()
+        if isinstance(child.block, ImageChooserBlock) and child.value
+    ]
+    prefetch_renditions(images, {IMAGE_BLOCK_FILTER_SPEC})
+
+    rendered = {}
+    for index, child in children.items():
+        if isinstance(child.block, RichTextBlock):
+            rendered[index] = richtext(child.value, rewriter=rewriter)
+        elif isinstance(child.block, ImageChooserBlock) and child.value:
+            rendition = get_prefetched_rendition(child.value, IMAGE_BLOCK_FILTER_SPEC)
+            if rendition is not None:
+                rendered[index] = rendition.img_tag()
+            else:
+                # Not generated yet
+                rendered[index] = conditional_escape(child.render_as_block(context))
+        else:
+            rendered[index] = conditional_escape(child.render_as_block(context))
+    return rendered
+
+
+def render_stream(page, stream_value, context=None, use_cache=True):
+    """
+    Returns the rendered blocks of stream_value, a StreamField of page, as a
+    list of HTML strings.
+
+    Blocks only depend on their own value and the pages they link to, they
+    must not use the request from the context as they are cached for all
+    requests.
+    """
+    raw_blocks = list(stream_value.raw_data)
+    marker = render_cache_marker(page) if use_cache else None
+    if marker is None:
+        rendered = render_blocks(stream_value, range(len(raw_blocks)), context)
+        return [rendered[index] for index in range(len(raw_blocks))]
+
+    cache = get_render_cache()
+    keys = {
+        index: block_cache_key(page, marker, raw_block["id"])
+        for index, raw_block in enumerate(raw_blocks)
+        if raw_block.get("id")
+    }
+    cached = cache.get_many(keys.values())
+    rendered = {index: cached[key] for index, key in keys.items() if key in cached}
+
+    missing = [index for index in range(len(raw_blocks)) if index not in rendered]
+    if missing:
+        new = render_blocks(stream_value, missing, context)
+        cache.set_many({keys[index]: new[index] for index in missing if index in keys})
+        rendered.update(new)
+
+    return [rendered[index] for index in range(len(raw_blocks))]
@@ -0,0 +1,307 @@
+"""
+Surrogate keys for a caching proxy or CDN in front of the site.
+
+While a response is rendered, the pages, images and snippets it shows add
+keys to the request with add_surrogate_keys(). SurrogateKeyMiddleware sends
+them in a Surrogate-Key header (space separated, Fastly and Varnish xkey)
+and a Cache-Tag header (comma separated, Cloudflare):
+
+* "page-<id>" for a page and the pages it lists,
+* "image-<id>" for the images of their bodies and header images,
+* "blogcategory-<id>" and "tag-<id>" for the categories and tags shown,
+* "blogpages" and "blogcategories" for responses that depend on all blog
+  pages or all categories, like the blog sidebar,
+* ALL_KEY on every tagged response.
+
+When a page is published or unpublished, or an image, category or tag is
+saved or deleted, the keys of the responses that show it are purged through
+the backend in MIGCONTROL_PURGE_BACKEND once the transaction commits, those
+of a whole transaction at once. Like the page cache, publishing a menu page,
+moving, renaming or deleting a page purges ALL_KEY. With purging set up,
+MIGCONTROL_PUBLIC_MAX_AGE can be raised far above the default.
+
+For development, "manage.py run_purge_server" runs a stand-in purge endpoint
+that prints the keys it receives.
+"""
+import json
+import logging
+import urllib.error
+import urllib.request
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete
+from django.db.models.signals import post_save
+from django.utils.module_loading import import_string
+from taggit.models import Tag
+from wagtail.core import hooks
+from wagtail.core.blocks import RichTextBlock
+from wagtail.core.fields import RichTextField
+from wagtail.core.fields import StreamField
+from wagtail.core.models import Page
+from wagtail.core.rich_text.rewriters import extract_attrs
+from wagtail.core.rich_text.rewriters import FIND_EMBED_TAG
+from wagtail.images import get_image_model
+from wagtail.images.blocks import ImageChooserBlock
+
+from migcontrol.navigation import changes_every_page
+from migcontrol.rendering import site_content_changed
+
+logger = logging.getLogger(__name__)
+
+
+PURGE_BACKEND = getattr(
+    settings, "MIGCONTROL_PURGE_BACKEND", "migcontrol.surrogate.HTTPPurgeBackend"
+)
+
+PURGE_URL = getattr(settings, "MIGCONTROL_PURGE_URL", None)
+
+# Extra headers of the purge requests, like {"Fastly-Key": "..."}
+PURGE_HEADERS = getattr(settings, "MIGCONTROL_PURGE_HEADERS", {})
+
+PURGE_TIMEOUT = getattr(settings, "MIGCONTROL_PURGE_TIMEOUT", 5)
+
+# Fastly accepts at most 256 keys per purge request
+PURGE_BATCH_SIZE = 256
+
+SURROGATE_HEADERS = ["Surrogate-Key", "Cache-Tag"]
+
+ALL_KEY = "all"
+BLOG_PAGES_KEY = "blogpages"
+BLOG_CATEGORIES_KEY = "blogcategories"
+
+
+def page_key(page_id):
+    return "page-{}".format(page_id)
+
+
+def image_key(image_id):
+    return "image-{}".format(image_id)
+
+
+def category_key(category_id):
+    return "blogcategory-{}".format(category_id)
+
+
+def tag_key(tag_id):
+    return "tag-{}".format(tag_id)
+
+
+def add_surrogate_keys(request, keys):
+    """
+    Adds the keys to the response of the request. Does nothing without a
+    request, for instance when a template is rendered by a command.
+    """
+    if request is None:
+        return
+    try:
+        request._surrogate_keys.update(keys)
+    except AttributeError:
+        request._surrogate_keys = set(keys)
+
+
+def get_richtext_image_ids(html):
+    return {
+        attrs["id"]
+        for attrs in map(extract_attrs, FIND_EMBED_TAG.findall(html))
+        if attrs.get("embedtype") == "image" and attrs.get("id")
+    }
+
+
+def get_stream_image_ids(stream_value):
+    """
+    Image ids of the top level image and rich text blocks, read from the raw
+    data so nothing is loaded.
+    """
+    image_ids = set()
+    child_blocks = stream_value.stream_block.child_blocks
+    for item in stream_value.raw_data:
+        block = child_blocks.get(item["type"])
+        if isinstance(block, ImageChooserBlock) and item["value"]:
+            image_ids.add(item["value"])
+        elif isinstance(block, RichTextBlock) and item["value"]:
+            image_ids |= get_richtext_image_ids(item["value"])
+    return image_ids
+
+
+def get_page_surrogate_keys(page):
+    """
+    The key of the specific page and of the images of its rich text fields,
+    StreamFields and image foreign keys.
+    """
+    image_model = get_image_model()
+    image_ids = set()
+    for field in page._meta.concrete_fields:
+        if isinstance(field, RichTextField):
+            image_ids |= get_richtext_image_ids(getattr(page, field.attname) or "")
+        elif isinstance(field, StreamField):
+            image_ids |= get_stream_image_ids(getattr(page, field.attname))
+        elif field.is_relation and field.related_model is image_model:
+            image_ids.add(getattr(page, field.attname))
+    return {page_key(page.pk)} | {
+        image_key(image_id) for image_id in image_ids if image_id
+    }
+
+
+def get_blog_page_surrogate_keys(blog_page):
+    """
+    The keys of a blog page with its categories and tags, for the page
+    itself and for listings.
+    """
+    return (
+        get_page_surrogate_keys(blog_page)
+        | {
+            category_key(category.category_id)
+            for category in blog_page.categories.all()
+        }
+        | {tag_key(item.tag_id) for item in blog_page.tagged_items.all()}
+    )
+
+
+@hooks.register("before_serve_page")
+def add_served_page_keys(page, request, serve_args, serve_kwargs):
+    add_surrogate_keys(request, get_page_surrogate_keys(page))
+
+
+class SurrogateKeyMiddleware:
+    """
+    Must come last in MIDDLEWARE, so the headers are part of the responses
+    stored by PageCacheMiddleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        keys = getattr(request, "_surrogate_keys", None)
+        if keys and response.status_code in (200, 304):
+            keys = sorted(keys | {ALL_KEY})
+            response["Surrogate-Key"] = " ".join(keys)
+            response["Cache-Tag"] = ",".join(keys)
+        return response
+
+
+class HTTPPurgeBackend:
+    """
+    POSTs {"surrogate_keys": [...]} to MIGCONTROL_PURGE_URL, the format of
+    Fastly's bulk purge API. Does nothing when no URL is set. Failures are
+    logged, the cached responses then expire with their max-age.
+    """
+
+    def __init__(self, url=None, headers=None, timeout=PURGE_TIMEOUT):
+        self.url = PURGE_URL if url is None else url
+        self.headers = PURGE_HEADERS if headers is None else headers
+        self.timeout = timeout
+
+    def purge(self, keys):
+        if not self.url:
+            return
+        keys = sorted(keys)
+        for start in range(0, len(keys), PURGE_BATCH_SIZE):
+            batch = keys[start:][:PURGE_BATCH_SIZE]
+            request = urllib.request.Request(
+                self.url,
+                data=json.dumps({"surrogate_keys": batch}).encode(),
+                headers=dict(self.headers, **{"Content-Type": "application/json"}),
+                method="POST",
+            )
+            try:
+                with urllib.request.urlopen(request, timeout=self.timeout):
+                    pass
+            except (urllib.error.URLError, OSError) as e:
+                logger.error("Couldn't purge %s from %s: %s", batch, self.url, e)
+
+
+def get_purge_backend():
+    return import_string(PURGE_BACKEND)()
+
+
+class PendingPurge:
+    """
+    The on_commit() callback that purges the keys collected during a
+    transaction.
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.keys = set()
+
+    def is_pending(self):
+        # Rolling back drops the callback
+        return any(func is self for _, func in self.connection.run_on_commit)
+
+    def __call__(self):
+        if getattr(self.connection, "_pending_purge", None) is self:
+            del self.connection._pending_purge
+        get_purge_backend().purge(self.keys)
+
+
+def purge_surrogate_keys(keys):
+    """
+    Purges the keys once the current transaction commits, so the proxy
+    can't fetch and cache the old content again in between. The keys of
+    all calls during a transaction are purged together, publishing a page
+    with its categories and tags is one purge request.
+    """
+    keys = set(keys)
+    if not keys:
+        return
+    connection = transaction.get_connection()
+    pending = getattr(connection, "_pending_purge", None)
+    if pending is not None and pending.is_pending():
+        pending.keys |= keys
+        return
+    pending = connection._pending_purge = PendingPurge(connection)
+    pending.keys |= keys
+    # Runs right away outside of a transaction
+    transaction.on_commit(pending)
+
+
+def get_published_page_keys(page):
+    """
+    The keys to purge when the page is published or unpublished: the page,
+    its translations and their ancestors, which may list them.
+    """
+    translations = Page.objects.filter(translation_key=page.translation_key)
+    keys = set()
+    for translation_page in translations:
+        keys.add(page_key(translation_page.pk))
+        keys.update(
+            page_key(pk)
+            for pk in translation_page.get_ancestors().values_list("pk", flat=True)
+        )
+    if page.specific_class and page.specific_class._meta.label == "blog.BlogPage":
+        keys.add(BLOG_PAGES_KEY)
+    return keys
+
+
+def purge_page_handler(sender, instance, tree_changed, **kwargs):
+    if changes_every_page(instance, tree_changed):
+        purge_surrogate_keys([ALL_KEY])
+    else:
+        purge_surrogate_keys(get_published_page_keys(instance))
+
+
+def purge_image_handler(sender, instance, **kwargs):
+    purge_surrogate_keys([image_key(instance.pk)])
+
+
+def purge_category_handler(sender, instance, **kwargs):
+    purge_surrogate_keys([category_key(instance.pk), BLOG_CATEGORIES_KEY])
+
+
+def purge_tag_handler(sender, instance, **kwargs):
+    purge_surrogate_keys([tag_key(instance.pk)])
+
+
+site_content_changed.connect(purge_page_handler)
+post_save.connect(purge_image_handler, sender=get_image_model())
+post_delete.connect(purge_image_handler, sender=get_image_model())
+post_save.connect(purge_category_handler, sender="blog.BlogCategory")
+post_delete.connect(purge_category_handler, sender="blog.BlogCategory")
+post_save.connect(purge_tag_handler, sender=Tag)
+post_delete.connect(purge_tag_handler, sender=Tag)
+# Signals of the proxy are sent with the proxy as sender
+post_save.connect(purge_tag_handler, sender="blog.BlogTag")
+post_delete.connect(purge_tag_handler, sender="blog.BlogTag")
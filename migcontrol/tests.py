@@ -0,0 +1,269 @@
+import datetime
+import json
+import threading
+import time
+from unittest import mock
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache.backends.locmem import LocMemCache
+from django.test import override_settings
+from django.test import SimpleTestCase
+from django.test import TestCase
+from taggit.models import Tag
+
+from blog.management.commands.run_purge_server import make_purge_server
+from blog.models import BlogCategory
+from blog.models import BlogIndexPage
+from blog.models import BlogPage
+from migcontrol.pagecache import get_page_cache
+from migcontrol.pagecache import get_site_version
+from migcontrol.pagination import KeysetPaginator
+from migcontrol.rendering import get_render_cache
+from migcontrol.rendering import get_version
+from migcontrol.stale import get_or_refresh
+from migcontrol.stale import REFRESH_LOCK_TIMEOUT
+
+
+class GetOrRefreshTest(SimpleTestCase):
+    """
+    A burst of threads asks for the same entry at once. LocMemCache only
+    locks across threads, which is what a shared backend does across
+    processes.
+    """
+
+    threads = 20
+
+    def setUp(self):
+        self.cache = LocMemCache("migcontrol-tests", {})
+        # Shared by all LocMemCaches of the same name
+        self.cache.clear()
+        self.computed = []
+        self.lock = threading.Lock()
+
+    def compute(self, value):
+        def compute():
+            with self.lock:
+                self.computed.append(value)
+            time.sleep(0.2)
+            return value
+
+        return compute
+
+    def burst(self, compute, **kwargs):
+        barrier = threading.Barrier(self.threads)
+        results = []
+
+        def run():
+            barrier.wait()
+            try:
+                result = get_or_refresh(self.cache, "key", compute, **kwargs)
+            except ValueError as e:
+                result = e
+            with self.lock:
+                results.append(result)
+
+        threads = [threading.Thread(target=run) for __ in range(self.threads)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_miss_is_computed_once(self):
+        results = self.burst(self.compute("new"), soft_ttl=60)
+        self.assertEqual(self.computed, ["new"])
+        self.assertEqual(results, ["new"] * self.threads)
+
+    def test_stale_entry_is_refreshed_once(self):
+        get_or_refresh(self.cache, "key", lambda: "old", soft_ttl=0)
+        results = self.burst(self.compute("new"), soft_ttl=60)
+        self.assertEqual(self.computed, ["new"])
+        self.assertEqual(sorted(results), ["new"] + ["old"] * (self.threads - 1))
+        # The refreshed entry is fresh
+        self.assertEqual(
+            get_or_refresh(self.cache, "key", self.compute("newer")), "new"
+        )
+
+    def test_failed_compute_is_retried_once(self):
+        compute = self.compute("new")
+
+        def fail_once():
+            if not self.computed:
+                with self.lock:
+                    self.computed.append("error")
+                time.sleep(0.2)
+                raise ValueError
+            return compute()
+
+        started = time.monotonic()
+        results = self.burst(fail_once, soft_ttl=60)
+        # The others stop waiting as soon as the lock is released
+        self.assertLess(time.monotonic() - started, REFRESH_LOCK_TIMEOUT)
+        self.assertEqual(self.computed, ["error", "new"])
+        self.assertIsInstance(results[0], ValueError)
+        self.assertEqual(results[1:], ["new"] * (self.threads - 1))
+
+    def test_other_version_is_a_miss(self):
+        get_or_refresh(self.cache, "key", lambda: "old", version=1)
+        results = self.burst(self.compute("new"), version=2)
+        self.assertEqual(self.computed, ["new"])
+        self.assertEqual(results, ["new"] * self.threads)
+
+
+def small_caches(max_entries):
+    """
+    CACHES with the entry caches culled after max_entries entries.
+    """
+    caches = {alias: dict(options) for alias, options in settings.CACHES.items()}
+    for alias in ["renders", "pages"]:
+        caches[alias]["OPTIONS"] = {"MAX_ENTRIES": max_entries, "CULL_FREQUENCY": 2}
+    return caches
+
+
+@override_settings(CACHES=small_caches(10))
+class VersionCullTest(TestCase):
+    def test_culling_keeps_versions(self):
+        versions = [get_version("migcontrol:test-version"), get_site_version()]
+        # The database cache culls the lowest keys first, these sort after
+        # the version keys
+        keys = ["~entry-{}".format(number) for number in range(30)]
+        for cache in [get_render_cache(), get_page_cache()]:
+            for key in keys:
+                cache.set(key, key)
+            # Entries were culled
+            self.assertLess(len(cache.get_many(keys)), len(keys))
+        self.assertEqual(
+            [get_version("migcontrol:test-version"), get_site_version()], versions
+        )
+
+
+class PurgeTest(TestCase):
+    def setUp(self):
+        self.server = make_purge_server(("127.0.0.1", 0))
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        url = "http://127.0.0.1:{}/".format(self.server.server_port)
+        patcher = mock.patch("migcontrol.surrogate.PURGE_URL", url)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_transaction_is_purged_at_once(self):
+        index = BlogIndexPage.objects.get(locale__language_code="en")
+        blog_page = index.add_child(instance=BlogPage(title="Post", slug="post"))
+        with self.captureOnCommitCallbacks(execute=True):
+            blog_page.save_revision().publish()
+            category = BlogCategory.objects.create(name="News", slug="news")
+            tag = Tag.objects.create(name="asylum", slug="asylum")
+        ancestor_keys = [
+            "page-{}".format(page.pk) for page in blog_page.get_ancestors()
+        ]
+        self.assertEqual(
+            self.server.purged,
+            [
+                sorted(
+                    ancestor_keys
+                    + [
+                        "page-{}".format(blog_page.pk),
+                        "blogpages",
+                        "blogcategory-{}".format(category.pk),
+                        "blogcategories",
+                        "tag-{}".format(tag.pk),
+                    ]
+                )
+            ],
+        )
+
+
+class StoredBodyTest(TestCase):
+    def setUp(self):
+        index = BlogIndexPage.objects.get(locale__language_code="en")
+        self.target = index.add_child(instance=BlogPage(title="Target", slug="old"))
+        self.target.save_revision().publish()
+        self.page = index.add_child(
+            instance=BlogPage(
+                title="Post",
+                slug="post",
+                body_richtext='<p><a linktype="page" id="{}">Target</a></p>'.format(
+                    self.target.pk
+                ),
+            )
+        )
+        self.page.save_revision().publish()
+
+    def get_body(self):
+        return BlogPage.objects.get(pk=self.page.pk).get_body()
+
+    def test_stored_body_follows_url_changes(self):
+        self.assertIn("/blog/old/", self.get_body())
+        self.target.slug = "new"
+        # page_slug_changed is sent on commit
+        with self.captureOnCommitCallbacks(execute=True):
+            self.target.save_revision().publish()
+        self.assertIn("/blog/new/", self.get_body())
+        self.page.refresh_from_db()
+        self.assertIn("/blog/old/", self.page.rendered_html)
+        self.page.store_rendered_body()
+        self.assertIn("/blog/new/", self.page.rendered_html)
+
+    def test_stored_body_is_not_in_revisions(self):
+        content = json.loads(self.page.get_latest_revision().content_json)
+        for name in self.page.stored_body_fields:
+            self.assertNotIn(name, content)
+        self.assertIn("/blog/old/", self.get_body())
+
+
+def make_cursor(*key):
+    return signing.b64_encode(json.dumps(key).encode()).decode()
+
+
+class KeysetPaginatorTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        index = BlogIndexPage.objects.get(locale__language_code="en")
+        for day in range(1, 4):
+            index.add_child(
+                instance=BlogPage(
+                    title="Post {}".format(day),
+                    slug="post-{}".format(day),
+                    date=datetime.date(2020, 1, day),
+                )
+            ).save_revision().publish()
+
+    def setUp(self):
+        self.paginator = KeysetPaginator(BlogPage.objects.live(), 2, "date")
+
+    def test_pages(self):
+        first = self.paginator.page()
+        self.assertEqual([page.slug for page in first], ["post-3", "post-2"])
+        second = self.paginator.page(after=first.next_cursor)
+        self.assertEqual([page.slug for page in second], ["post-1"])
+        self.assertFalse(second.has_next())
+        previous = self.paginator.page(before=second.previous_cursor)
+        self.assertEqual([page.slug for page in previous], ["post-3", "post-2"])
+
+    def test_invalid_cursor_gives_first_page(self):
+        pk = BlogPage.objects.get(slug="post-2").pk
+        cursors = [
+            "invalid",
+            make_cursor("2020-01-02"),
+            make_cursor("not a date", pk),
+            make_cursor("2020-01-02", None),
+            make_cursor(None, pk),
+            make_cursor(None, None),
+        ]
+        for cursor in cursors:
+            for direction in ["after", "before"]:
+                with self.subTest(cursor=cursor, direction=direction):
+                    self.assertIsNone(self.paginator.parse_cursor(cursor))
+                    keyset_page = self.paginator.page(**{direction: cursor})
+                    self.assertEqual(
+                        [page.slug for page in keyset_page], ["post-3", "post-2"]
+                    )
+                    response = self.client.get(
+                        "/en/blog/", {direction: cursor}, HTTP_HOST="localhost"
+                    )
+                    self.assertEqual(response.status_code, 200)
@@ -0,0 +1,137 @@
+"""
+Thumbnails of static files, generated at build time.
+
+The thumbnails the templates use are listed in the
+MIGCONTROL_STATIC_THUMBNAILS setting as (path, geometry, options). The
+generate_static_thumbnails command renders them with sorl-thumbnail into
+STATIC_ROOT, after collectstatic, and writes a manifest of their URLs. The
+get_static_thumbnail tag looks them up in the manifest, which is loaded once
+per process, so rendering them doesn't touch the static finders or sorl's
+key value store.
+"""
+import functools
+import hashlib
+import json
+import os
+from collections import namedtuple
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.core.files.storage import FileSystemStorage
+from sorl.thumbnail import default
+from sorl.thumbnail.base import EXTENSIONS
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.images import ImageFile
+from sorl.thumbnail.parsers import parse_geometry
+
+
+MANIFEST_NAME = "static-thumbnails.json"
+
+THUMBNAILS_DIR = "thumbnails"
+
+
+StaticThumbnail = namedtuple("StaticThumbnail", ["url", "width", "height"])
+
+
+class StaticPath(str):
+    def __new__(cls, path: str, storage: FileSystemStorage):
+        obj = super().__new__(cls, path)
+        obj.storage = storage
+        return obj
+
+
+source_storage = FileSystemStorage(location="/")
+
+
+def get_registered_thumbnails():
+    return getattr(settings, "MIGCONTROL_STATIC_THUMBNAILS", [])
+
+
+def thumbnail_key(file_, geometry, options):
+    return "{} {} {}".format(file_, geometry, json.dumps(options, sort_keys=True))
+
+
+def generate_static_thumbnail(file_, geometry, options, storage):
+    """
+    Renders the thumbnail of the static file into storage and returns it as
+    StaticThumbnail. The file name contains a hash of the source and the
+    options, so changed thumbnails get a new URL.
+    """
+    disk_path = finders.find(file_)
+    if not disk_path:
+        raise FileNotFoundError(file_)
+
+    key = thumbnail_key(file_, geometry, options)
+    options = dict(ThumbnailBackend.default_options, **options)
+    with open(disk_path, "rb") as source_file:
+        digest = hashlib.md5(source_file.read() + key.encode()).hexdigest()[:12]
+    name = "{}/{}.{}.{}".format(
+        THUMBNAILS_DIR,
+        os.path.splitext(os.path.basename(file_))[0],
+        digest,
+        EXTENSIONS[options["format"]],
+    )
+
+    source_image = default.engine.get_image(
+        ImageFile(StaticPath(disk_path, source_storage))
+    )
+    try:
+        ratio = default.engine.get_image_ratio(source_image, options)
+        image = default.engine.create(
+            source_image, parse_geometry(geometry, ratio), options
+        )
+        if storage.exists(name):
+            storage.delete(name)
+        default.engine.write(image, options, ImageFile(name, storage))
+        width, height = default.engine.get_image_size(image)
+    finally:
+        default.engine.cleanup(source_image)
+
+    return StaticThumbnail(settings.STATIC_URL + name, width, height)
+
+
+def generate_static_thumbnails():
+    """
+    Generates all registered thumbnails into STATIC_ROOT and writes the
+    manifest. Returns {key: StaticThumbnail}.
+    """
+    storage = FileSystemStorage(location=settings.STATIC_ROOT)
+    thumbnails = {}
+    for file_, geometry, options in get_registered_thumbnails():
+        thumbnails[thumbnail_key(file_, geometry, options)] = generate_static_thumbnail(
+            file_, geometry, options, storage
+        )
+
+    manifest_path = os.path.join(settings.STATIC_ROOT, MANIFEST_NAME)
+    with open(manifest_path, "w") as manifest:
+        json.dump(
+            {key: thumbnail._asdict() for key, thumbnail in thumbnails.items()},
+            manifest,
+            indent=2,
+            sort_keys=True,
+        )
+    return thumbnails
+
+
+@functools.lru_cache(maxsize=None)
+def load_manifest():
+    """
+    {key: StaticThumbnail}, read once per process. Empty when the thumbnails
+    weren't generated, for instance in development.
+    """
+    try:
+        with open(os.path.join(settings.STATIC_ROOT, MANIFEST_NAME)) as manifest:
+            return {
+                key: StaticThumbnail(**thumbnail)
+                for key, thumbnail in json.load(manifest).items()
+            }
+    except FileNotFoundError:
+        return {}
+
+
+def get_static_thumbnail(file_, geometry, options):
+    """
+    Returns the generated StaticThumbnail, or None if it isn't in the
+    manifest.
+    """
+    return load_manifest().get(thumbnail_key(file_, geometry, options))
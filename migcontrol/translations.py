@@ -0,0 +1,100 @@
+"""
+URLs of a page in every language, for the language chooser.
+
+The URL for a language is the one of the live translation of the page in
+that language, or else of the nearest ancestor that has one. The
+translations of the page and all its ancestors are loaded with one query,
+and the URLs for all languages are computed from that.
+
+The result is memoized per published revision of the page. As it depends on
+the translations of other pages too, it's also dropped whenever any page is
+published, unpublished, moved, renamed or deleted.
+"""
+from django.conf import settings
+from django.utils import translation
+from wagtail.core.models import Page
+
+from migcontrol.rendering import bump_version
+from migcontrol.rendering import cached_render
+from migcontrol.rendering import get_version
+from migcontrol.rendering import site_content_changed
+
+
+TRANSLATIONS_VERSION_KEY = "migcontrol:translations-version"
+
+
+def get_translations_version():
+    return get_version(TRANSLATIONS_VERSION_KEY)
+
+
+def get_ancestor_paths(page):
+    """
+    Paths of the page and its ancestors, from the page up to the root.
+    """
+    return [page.path[:length] for length in range(len(page.path), 0, -page.steplen)]
+
+
+def get_fallback_url(chain, translations, language_code):
+    for ancestor in chain:
+        if ancestor.locale.language_code == language_code:
+            return ancestor.url
+        page_translation = translations.get((ancestor.translation_key, language_code))
+        if page_translation is not None:
+            return page_translation.url
+    return chain[-1].url
+
+
+def resolve_language_urls(page):
+    """
+    Returns {language_code: url} for all LANGUAGES, with one query.
+    """
+    paths = get_ancestor_paths(page)
+    pages = Page.objects.filter(
+        translation_key__in=Page.objects.filter(path__in=paths).values(
+            "translation_key"
+        )
+    ).select_related("locale")
+
+    ancestors = {}
+    translations = {}
+    for page_translation in pages:
+        if page_translation.path in paths:
+            ancestors[page_translation.path] = page_translation
+        if page_translation.live:
+            translations[
+                (
+                    page_translation.translation_key,
+                    page_translation.locale.language_code,
+                )
+            ] = page_translation
+    # A preview of a new page isn't in the tree yet
+    chain = [ancestors[path] for path in paths if path in ancestors] or [page]
+
+    urls = {}
+    for language_code, __ in settings.LANGUAGES:
+        # The URL prefix of a locale depends on the active language
+        with translation.override(language_code):
+            urls[language_code] = get_fallback_url(chain, translations, language_code)
+    return urls
+
+
+def get_language_urls(page):
+    """
+    Returns {language_code: url} for all LANGUAGES, memoized on the page and
+    per published revision.
+    """
+    if not hasattr(page, "_language_urls"):
+        page._language_urls = cached_render(
+            page,
+            "language_urls",
+            lambda: resolve_language_urls(page),
+            variant=get_translations_version(),
+        )
+    return page._language_urls
+
+
+def invalidate_language_urls_handler(sender, **kwargs):
+    bump_version(TRANSLATIONS_VERSION_KEY)
+
+
+site_content_changed.connect(invalidate_language_urls_handler)
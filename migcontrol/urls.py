@@ -9,11 +9,13 @@ from wagtail.documents import urls as wagtaildocs_urls
 from wagtail_footnotes import urls as footnotes_urls
 
 from blog import urls as blog_urls
+from migcontrol.pagecache import page_cache_stats_view
 from search import views as search_views
 
 urlpatterns = [
     path("documents/", include(wagtaildocs_urls)),
     path("footnotes/", include(footnotes_urls)),
+    path("page-cache-stats/", page_cache_stats_view, name="page_cache_stats"),
 ]
 
 
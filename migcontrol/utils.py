@@ -1,54 +1,61 @@
 from bs4 import BeautifulSoup
+from django.template.defaultfilters import slugify
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
 
 
-def until_next_outer(lst, h_tag):
-    for element in lst:
-        if element.name > h_tag:
-            yield element
-        else:
-            return
-
-
-def toc(lst):
+def toc(headings):
     """
-    Creates a TOC from a list of BeautifulSoup elements
+    Creates a TOC from a list of (level, text, anchor) tuples in document
+    order, in linear time.
 
-    Called like this:
-
-    toc(soup.find_all(["h1", "h2", "h3", "h4", "h5"]))
+    Returns [(text, [*children])]. A heading becomes a child of the closest
+    preceding heading with a lower level, so skipped levels (an h4 directly
+    after an h2) are nested under the h2. Headings with no such preceding
+    heading are at the top level.
     """
+    root = []
+    # Stack of (level, children) of the headings that are still open
+    stack = []
+    for level, text, _anchor in headings:
+        while stack and stack[-1][0] >= level:
+            stack.pop()
+        children = []
+        (stack[-1][1] if stack else root).append((text, children))
+        stack.append((level, children))
+    return root
 
-    if not lst:
-        return []
-
-    item0 = lst[0]
 
-    if len(lst) == 1:
-        return [(item0.text, [])]
+def get_toc(body):
+    """
+    [(name, [*children])]
+    """
+    soup = BeautifulSoup(body, "html5lib")
+    return toc(
+        (int(element.name[1]), element.text, element.get("id"))
+        for element in soup.find_all(["h1", "h2", "h3", "h4", "h5"])
+    )
 
-    children = toc(list(until_next_outer(lst[1:], item0.name)))
-    siblings = [(item0.text, children)]
-    start_offset = 1 + len(children)
-    for cnt, item in enumerate(lst[start_offset:]):
 
-        if item.name == item0.name:
-            children_detect_offset = start_offset + cnt + 1
-            children_list = list(
-                until_next_outer(lst[children_detect_offset:], item.name)
+def render_toc_sections(sections, parts):
+    for section, children in sections:
+        parts.append(
+            '<a class="nav-link" href="#header-{}">{}</a>'.format(
+                slugify(section), escape(section)
             )
-            siblings.append((item.text, toc(children_list)))
-
-    return siblings
+        )
+        if children:
+            parts.append('<nav class="nav nav-pills flex-column ms-3 my-1">')
+            render_toc_sections(children, parts)
+            parts.append("</nav>")
 
 
-def get_toc(body):
+def render_toc(toc):
     """
-    [(name, [*children])]
+    Renders a TOC from toc() as nested <nav> elements linking to the anchored
+    headings, in a single pass.
     """
-    soup = BeautifulSoup(body, "html5lib")
-    # Need to build this in a list, otherwise evaluating whether it is
-    # empty or not causes problems in templates
-    return_list = []
-    for element, children in toc(soup.find_all(["h1", "h2", "h3", "h4", "h5"])):
-        return_list.append((element, children))
-    return return_list
+    parts = ['<nav class="nav nav-pills flex-column">']
+    render_toc_sections(toc, parts)
+    parts.append("</nav>")
+    return mark_safe("".join(parts))
@@ -3,6 +3,9 @@ WSGI config for migcontrol project.
 
 It exposes the WSGI callable as a module-level variable named ``application``.
 
+Static files are served by StaticFilesApplication, in front of Django, see
+migcontrol/staticfiles.py.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/3.2/howto/deployment/wsgi/
 """
@@ -13,3 +16,7 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "migcontrol.settings.dev")
 
 application = get_wsgi_application()
+
+from migcontrol.staticfiles import StaticFilesApplication  # noqa: E402
+
+application = StaticFilesApplication(application)
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.25 on 2026-10-17 21:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wiki', '0004_wikipage_rendered_html'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='wikipage',
+            name='rendered_tree_version',
+            field=models.CharField(blank=True, editable=False, help_text='The tree version the stored body was rendered with', max_length=32),
+        ),
+    ]
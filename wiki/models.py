@@ -1,6 +1,4 @@
-from bs4 import BeautifulSoup
 from django.db import models
-from django.template.defaultfilters import slugify
 from django.utils.translation import gettext_lazy as _
 from django_countries.fields import CountryField
 from wagtail.admin.edit_handlers import FieldPanel
@@ -10,14 +8,16 @@ from wagtail.core import blocks
 from wagtail.core.fields import RichTextField
 from wagtail.core.fields import StreamField
 from wagtail.core.models import Page
-from wagtail.core.templatetags.wagtailcore_tags import richtext
 from wagtail.images import get_image_model_string
 from wagtail.images.blocks import ImageChooserBlock
 
-from migcontrol.utils import get_toc
+from migcontrol.conditional import ConditionalServeMixin
+from migcontrol.conditional import ListingConditionalServeMixin
+from migcontrol.rendering import RenderedBodyMixin
+from migcontrol.richtext import richtext
 
 
-class WikiIndexPage(Page):
+class WikiIndexPage(ListingConditionalServeMixin, Page):
     template = "wiki/index.html"
 
     body = StreamField(
@@ -43,7 +43,7 @@ class WikiIndexPage(Page):
         return context
 
 
-class WikiPage(Page):
+class WikiPage(RenderedBodyMixin, ConditionalServeMixin, Page):
 
     wordpress_post_id = models.PositiveSmallIntegerField(
         blank=True, null=True, editable=False
@@ -99,6 +99,24 @@ class WikiPage(Page):
         ]
     )
 
+    rendered_html = models.TextField(
+        blank=True,
+        editable=False,
+        help_text="The body with anchored headings, stored when published",
+    )
+    toc_json = models.JSONField(
+        blank=True,
+        null=True,
+        editable=False,
+        help_text="Headings of the body as [level, text, anchor], stored when published",
+    )
+    rendered_tree_version = models.CharField(
+        max_length=32,
+        blank=True,
+        editable=False,
+        help_text="The tree version the stored body was rendered with",
+    )
+
     def get_display_country(self):
         return ", ".join(map(lambda c: c.name, self.country))
 
@@ -109,27 +127,5 @@ class WikiPage(Page):
         InlinePanel("footnotes", label="Footnotes"),
     ]
 
-    def get_toc(self):
-        """
-        [(name, [*children])]
-        """
-        return get_toc(self.get_body())
-
-    def get_body(self):  # noqa: max-complexity=11
-        body = richtext(self.description)
-
-        # Now let's add some id=... attributes to all h{1,2,3,4,5}
-        soup = BeautifulSoup(body, "html5lib")
-
-        # Beautiful soup unfortunately adds some noise to the structure, so we
-        # remove this again - see:
-        # https://stackoverflow.com/questions/21452823/beautifulsoup-how-should-i-obtain-the-body-contents
-        for attr in ["head", "html", "body"]:
-            if hasattr(soup, attr):
-                getattr(soup, attr).unwrap()
-
-        # Now let's add some id=... attributes to all h{1,2,3,4,5}
-        for element in soup.find_all(["h1", "h2", "h3", "h4", "h5"]):
-            element["id"] = "header-" + slugify(element.text)
-
-        return str(soup)
+    def expand_body(self):
+        return richtext(self.description)